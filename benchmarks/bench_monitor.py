@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Offline benchmark suite for claude_monitor.
+
+Feeds synthetic ccusage histories (benchmarks/synthetic.py) through stubbed
+run_ccusage() / stream_ccusage() and measures, per history size:
+
+  startup_incremental   start_monitor() with an up-to-date history store
+  startup_recalculate   start_monitor() with --recalculate over the full history (streamed)
+  decode_full           the pre-streaming --recalculate decode: json.loads + BlockIndex
+  frame                 one main-loop iteration (Monitor.tick + render_frame)
+  first_frame           the startup frame drawn from the saved status.json, before reconciliation
+  session_end           folding a snapshot in which the active block completed
+  full_recompute        PeriodAggregator.recompute() over the same snapshot
+  save_config_legacy    the old config.json write with `n` processed_sessions ids
+  store_upsert          recording one completed block in the history store
+  report_day            `report --by day` aggregation over the whole history (NumPy if installed)
+
+Results are printed as JSON lines (one per size and measurement) so runs of
+different versions can be compared. startup_recalculate and decode_full also
+report their peak traced memory (peak_kb). The real ccusage binary is never called.
+
+    python3 benchmarks/bench_monitor.py --sizes 10 1000 100000 --output bench.jsonl
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+DEFAULT_SIZES = [10, 100, 1_000, 10_000, 100_000]
+
+def measure(function, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return {"median_ms": statistics.median(samples) * 1000, "min_ms": min(samples) * 1000, "runs": repeat}
+
+def peak_memory_kb(function) -> float:
+    """Peak memory allocated by one call of `function`, beyond what was live before it."""
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        function()
+        return (tracemalloc.get_traced_memory()[1] - baseline) / 1024
+    finally:
+        tracemalloc.stop()
+
+class Harness:
+    """Runs claude_monitor against one synthetic payload inside a throw-away HOME."""
+
+    def __init__(self, monitor_module, synthetic, n_blocks: int):
+        self.cm = monitor_module
+        self.synthetic = synthetic
+        self.payload = synthetic.generate_payload(n_blocks)
+        self._by_since = {}
+        # What ccusage prints: the streaming path reads it in chunks
+        self.payload_text = json.dumps(self.payload, indent=2)
+        self.cm.run_ccusage = self.fake_run_ccusage
+        self.cm.stream_ccusage = self.fake_stream_ccusage
+        # The background fetcher would compete with the code being timed
+        self.cm.UsageFetcher.start = lambda fetcher: fetcher
+
+    def fake_run_ccusage(self, since_date=None, timeout=None):
+        if since_date not in self._by_since:
+            self._by_since[since_date] = self.synthetic.filter_since(self.payload, since_date)
+        return self._by_since[since_date]
+
+    def fake_stream_ccusage(self, since_date=None, timeout=None):
+        text = self.payload_text if since_date is None else json.dumps(self.fake_run_ccusage(since_date))
+        chunk = self.cm.Config.instance().STREAM_CHUNK_CHARS
+        for start in range(0, len(text), chunk):
+            yield text[start:start + chunk]
+
+    def decode_full(self):
+        return self.cm.BlockIndex.from_data(json.loads(self.payload_text))
+
+    def args(self, recalculate=False):
+        return argparse.Namespace(start_day=1, recalculate=recalculate, native=False, no_watch=True,
+                                  profile=False, metrics_file=None)
+
+    def reset_state(self):
+        config = self.cm.Config.instance()
+        for path in (config.HISTORY_DB_FILE, config.CONFIG_FILE, config.STATUS_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def start(self, recalculate=False):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.cm.start_monitor(self.args(recalculate))
+
+    def startup_recalculate(self):
+        self.reset_state()
+        self.start(recalculate=True).close()
+
+    def startup_incremental(self):
+        self.start().close()
+
+    def loaded_monitor(self):
+        monitor = self.start()
+        monitor.notifier = None
+        monitor.fetcher._snapshot = self.cm.UsageSnapshot(self.payload, time.time())
+        monitor.tick()
+        return monitor
+
+def run_size(cm, synthetic, n_blocks: int, repeat: int) -> list:
+    harness = Harness(cm, synthetic, n_blocks)
+    heavy_repeat = max(1, repeat // 5) if n_blocks >= 100_000 else repeat
+    results = {}
+    results["startup_recalculate"] = measure(harness.startup_recalculate, heavy_repeat)
+    results["startup_recalculate"]["peak_kb"] = peak_memory_kb(harness.startup_recalculate)
+    results["decode_full"] = measure(harness.decode_full, heavy_repeat)
+    results["decode_full"]["peak_kb"] = peak_memory_kb(harness.decode_full)
+    results["startup_incremental"] = measure(harness.startup_incremental, heavy_repeat)
+
+    monitor = harness.loaded_monitor()
+    results["frame"] = measure(lambda: cm.render_frame(monitor.tick()), repeat * 10)
+    # The ticks above saved status.json; the reconciliation thread itself is not started
+    results["first_frame"] = measure(
+        lambda: cm.render_frame(cm.StartupReconciler(harness.args(), threading.Event()).status()), repeat * 10)
+
+    # The active block completes: a new snapshot arrives with isActive cleared
+    ended = {"blocks": [dict(b, isActive=False) for b in harness.payload["blocks"]]}
+    ended_snapshot = cm.UsageSnapshot(ended, time.time())
+    def session_end():
+        monitor.aggregator._counted.discard(ended_snapshot.blocks.blocks[-1].id)
+        monitor.aggregator.observe(ended_snapshot.blocks)
+    results["session_end"] = measure(session_end, repeat)
+    results["full_recompute"] = measure(lambda: monitor.aggregator.recompute(ended_snapshot.blocks), repeat)
+
+    legacy_config = {"user_settings": {"start_day": 1, "timezone": "UTC"},
+                     "processed_sessions": [b["id"] for b in harness.payload["blocks"] if not b["isGap"]]}
+    results["save_config_legacy"] = measure(lambda: cm.save_config(legacy_config), heavy_repeat)
+    last_block = ended_snapshot.blocks.blocks[-1]
+    results["store_upsert"] = measure(lambda: monitor.store.upsert_blocks([last_block], 1), repeat)
+    utc = cm.Config.instance().UTC_TZ
+    results["report_day"] = measure(
+        lambda: cm.aggregate_report(cm.BlockColumns.from_blocks(ended_snapshot.blocks), "day", utc, 1), heavy_repeat)
+    monitor.close()
+
+    payload_bytes = len(json.dumps(harness.payload))
+    return [dict(name=name, blocks=n_blocks, payload_bytes=payload_bytes, **values)
+            for name, values in results.items()]
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark claude_monitor against synthetic ccusage histories.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Number of session blocks per history (up to 1000000).")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (frames use 10x).")
+    parser.add_argument("--output", help="Also append the JSON lines to this file.")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        # Config resolves ~ on first use, so HOME must point at the sandbox before the import
+        os.environ["HOME"] = home
+        import claude_monitor as cm
+        import synthetic
+        meta = {"version": cm.Config.instance().VERSION, "python": platform.python_version(),
+                "platform": sys.platform, "timestamp": time.time()}
+        lines = []
+        for n_blocks in options.sizes:
+            for result in run_size(cm, synthetic, n_blocks, options.repeat):
+                line = json.dumps(dict(meta, **result))
+                print(line, flush=True)
+                lines.append(line)
+    if options.output:
+        with open(options.output, 'a') as f:
+            f.write("\n".join(lines) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Latency check for `claude_monitor.py --once`.
+
+Target: answering from the persisted snapshot of a running monitor adds less than
+50 ms on top of a bare interpreter start. Two snapshots are checked: one written
+moments ago during a session, and one from an idle monitor about to redraw (idle
+monitors rewrite it once a minute). Everything runs in a throw-away HOME with a
+fake `ccusage` on PATH that records being called, so the result does not depend on
+real usage data. Exits with status 1 when the target is missed or --once falls
+back to running ccusage.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGET_MS = 50.0
+RUNS = 15
+
+def median_runtime_ms(command, env) -> float:
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=REPO_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+# Idle monitors redraw (and save their status) once a minute; this one is just before that
+IDLE_SNAPSHOT_AGE_SECONDS = 55
+
+def write_snapshot(home: str, idle: bool):
+    config_dir = os.path.join(home, ".config", "claude-monitor")
+    os.makedirs(config_dir, exist_ok=True)
+    now = time.time()
+    status = {
+        "version": "bench", "generated_at": now, "data_age": 1.0, "period_start": "2025-01-01",
+        "sessions_used": 12, "sessions_left": 38, "days_remaining": 20, "avg_sessions_per_day": 1.9,
+        "max_tokens": 1_000_000, "monthly_cost": 42.0,
+        "active_block": {"id": "bench", "start": now - 3600, "end": now + 4 * 3600, "tokens": 250_000,
+                         "token_limit": 1_000_000, "token_percent": 25.0, "time_percent": 20.0,
+                         "time_remaining": 4 * 3600, "cost": 3.5},
+    }
+    if idle:
+        status.update(generated_at=now - IDLE_SNAPSHOT_AGE_SECONDS, active_block=None)
+    with open(os.path.join(config_dir, "status.json"), 'w') as f:
+        json.dump(status, f)
+
+def write_fake_ccusage(bin_dir: str, marker: str):
+    path = os.path.join(bin_dir, "ccusage")
+    with open(path, 'w') as f:
+        f.write(f"#!/bin/sh\necho called >> '{marker}'\nsleep 1\necho '{{\"blocks\": []}}'\n")
+    os.chmod(path, 0o755)
+
+def main() -> int:
+    results = []
+    with tempfile.TemporaryDirectory() as home:
+        marker = os.path.join(home, "ccusage-calls")
+        write_fake_ccusage(home, marker)
+        env = dict(os.environ, HOME=home, PATH=home + os.pathsep + os.environ.get("PATH", ""))
+        # The target assumes cached bytecode, which the warm-up run below writes
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        baseline_ms = median_runtime_ms([sys.executable, "-c", "pass"], env)
+        for case, idle in (("active", False), ("idle", True)):
+            write_snapshot(home, idle)
+            # Warm the bytecode cache so the first sample does not include compilation
+            subprocess.run([sys.executable, "-m", "claude_monitor", "--once"], cwd=REPO_DIR, env=env,
+                           check=True, stdout=subprocess.DEVNULL)
+            once_ms = median_runtime_ms([sys.executable, "-m", "claude_monitor", "--once", "--format", "tmux"], env)
+            ccusage_calls = 0
+            if os.path.exists(marker):
+                with open(marker) as f:
+                    ccusage_calls = len(f.readlines())
+                os.remove(marker)
+            overhead_ms = once_ms - baseline_ms
+            results.append({"benchmark": "once_latency", "case": case, "interpreter_ms": round(baseline_ms, 2),
+                            "once_ms": round(once_ms, 2), "overhead_ms": round(overhead_ms, 2),
+                            "ccusage_calls": ccusage_calls, "target_ms": TARGET_MS,
+                            "passed": overhead_ms < TARGET_MS and ccusage_calls == 0})
+    for result in results:
+        print(json.dumps(result))
+    return 0 if all(result["passed"] for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Replay a `--record` log through the monitor loop as fast as possible.
+
+A virtual clock is stepped through the recording (by default one virtual second per
+frame, like the live display) while the recorded snapshots are fetched every
+CCUSAGE_FETCH_INTERVAL_SECONDS of virtual time. Reports the cost of one frame
+(Monitor.tick + render_frame), plus the sessions counted and the alerts delivered by
+the notification dispatcher (with their virtual time, in seconds from the start of the
+recording), as one JSON line. ccusage is never called and the real monitor state is
+not touched.
+
+    python3 claude_monitor.py --record session.jsonl.gz     # record a real session first
+    python3 benchmarks/bench_replay.py session.jsonl.gz --step 1
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# The clock is stepped by hand, far faster than real time; the dispatcher's waits are
+# shortened by this factor so that it keeps checking its windows against the virtual clock
+ALERT_TIME_SCALE = 1000
+
+def replay(cm, path: str, step: float) -> dict:
+    records = cm.load_recording(path)
+    if not records:
+        raise SystemExit(f"{path} contains no snapshots")
+    # Take the real clock's reading before the module's clock is swapped out
+    started = time.perf_counter()
+    clock = cm.VirtualClock(records[0][0], speed=0).install()
+    source = cm.SnapshotReplay(records, clock)
+    store = cm.HistoryStore()
+    aggregator = cm.PeriodAggregator(store, 1)
+    aggregator.rebuild(cm.BlockIndex.from_data(source.fetch()))
+    fetcher = cm.UsageFetcher(aggregator.period_start.strftime('%Y%m%d'), source=source.fetch)
+    alerts = cm._ReplayAlertLog()
+    args = argparse.Namespace(start_day=1, metrics_file=None)
+    notifier = cm.NotificationDispatcher([alerts], time_scale=ALERT_TIME_SCALE).start()
+    monitor = cm.Monitor(args, store, aggregator, fetcher, notifier)
+    fetch_interval = cm.Config.instance().CCUSAGE_FETCH_INTERVAL_SECONDS
+    next_fetch, end = clock.now(), source.end_time
+    samples = []
+    while clock.now() <= end:
+        if clock.now() >= next_fetch:
+            fetcher.fetch_once()
+            next_fetch += fetch_interval
+        frame_start = time.perf_counter()
+        cm.render_frame(monitor.tick())
+        samples.append(time.perf_counter() - frame_start)
+        clock.advance(step)
+    sessions = aggregator.sessions
+    monitor.close()
+    samples.sort()
+    return {"snapshots": len(records), "virtual_hours": (end - records[0][0]) / 3600, "frames": len(samples),
+            "frame_median_us": statistics.median(samples) * 1e6,
+            "frame_p99_us": samples[int(len(samples) * 0.99)] * 1e6, "frame_max_us": samples[-1] * 1e6,
+            "wall_seconds": time.perf_counter() - started, "sessions_used": sessions,
+            "alerts": [{"at": round(at - records[0][0]), "message": message} for at, _, message in alerts.sent]}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay a --record log through the monitor loop.")
+    parser.add_argument("recording", help="gzip JSON-lines file written by --record")
+    parser.add_argument("--step", type=float, default=1.0, help="Virtual seconds per frame. Default: 1")
+    parser.add_argument("--output", help="Also append the JSON line to this file.")
+    options = parser.parse_args()
+    recording = os.path.abspath(options.recording)
+
+    with tempfile.TemporaryDirectory() as home:
+        # Config resolves ~ on first use, so HOME must point at the sandbox before the import
+        os.environ["HOME"] = home
+        import claude_monitor as cm
+        result = dict(version=cm.Config.instance().VERSION, python=platform.python_version(),
+                      platform=sys.platform, timestamp=time.time(), **replay(cm, recording, options.step))
+    line = json.dumps(result)
+    print(line)
+    if options.output:
+        with open(options.output, 'a') as f:
+            f.write(line + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
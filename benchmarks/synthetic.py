@@ -0,0 +1,59 @@
+"""Synthetic `ccusage blocks -j` payloads for benchmarks.
+
+Blocks are laid out backwards from `now`: 5-hour sessions separated by random
+idle time, with gap blocks wherever the pause exceeds five hours (as ccusage
+reports them) and an optional active block at the end. Large counts naturally
+span many month boundaries.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+SESSION = timedelta(hours=5)
+
+def iso(moment: datetime) -> str:
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def generate_payload(n_blocks: int, now: datetime = None, active: bool = True, seed: int = 0) -> dict:
+    """Return {"blocks": [...]} with `n_blocks` session blocks, oldest first."""
+    rng = random.Random(seed)
+    now = (now or datetime.now(timezone.utc)).replace(minute=0, second=0, microsecond=0)
+    sessions = []
+    start = now - timedelta(hours=1) if active else now - SESSION - timedelta(hours=1)
+    for index in range(n_blocks):
+        is_active = active and index == 0
+        tokens = rng.randint(5_000, 2_000_000)
+        sessions.append({
+            "id": iso(start),
+            "startTime": iso(start),
+            "endTime": iso(start + SESSION),
+            "actualEndTime": iso(start + timedelta(minutes=rng.randint(5, 299))),
+            "isActive": is_active,
+            "isGap": False,
+            "entries": rng.randint(1, 400),
+            "tokenCounts": {"inputTokens": tokens // 10, "outputTokens": tokens // 10,
+                            "cacheCreationInputTokens": tokens // 5, "cacheReadInputTokens": tokens - tokens // 2},
+            "totalTokens": tokens,
+            "costUSD": round(tokens * rng.uniform(1.5, 9.0) / 1_000_000, 4),
+            "models": ["claude-sonnet-4-20250514"],
+        })
+        # Idle time before this session started, sometimes long enough for a gap block
+        start -= SESSION + timedelta(hours=rng.choice((0, 1, 2, 3, 8, 14)))
+    blocks = []
+    for session in reversed(sessions):
+        if blocks:
+            previous_end = datetime.strptime(blocks[-1]["actualEndTime"][:19], '%Y-%m-%dT%H:%M:%S')
+            next_start = datetime.strptime(session["startTime"][:19], '%Y-%m-%dT%H:%M:%S')
+            if next_start - previous_end > SESSION:
+                gap_start = previous_end + SESSION
+                blocks.append({"id": f"gap-{iso(gap_start)}", "startTime": iso(gap_start),
+                               "endTime": session["startTime"], "isActive": False, "isGap": True,
+                               "entries": 0, "totalTokens": 0, "costUSD": 0, "models": []})
+        blocks.append(session)
+    return {"blocks": blocks}
+
+def filter_since(payload: dict, since_date: str) -> dict:
+    """Emulate `ccusage blocks -s YYYYMMDD`."""
+    if not since_date:
+        return payload
+    since = f"{since_date[:4]}-{since_date[4:6]}-{since_date[6:8]}"
+    return {"blocks": [b for b in payload["blocks"] if b["startTime"][:10] >= since]}
@@ -1,14 +1,20 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
 import json
 import time
 import shutil
-import subprocess
 import argparse
 import calendar
+import threading
+import signal
+import bisect
+import math
 from datetime import datetime, timedelta, date
 from zoneinfo import ZoneInfo
+# subprocess, sqlite3 and socket are imported where they are used, so that
+# `--once` status queries do not pay for them at startup.
 
 # --- Configuration Singleton ---
 class Config:
@@ -28,13 +34,59 @@ class Config:
         self.VERSION = "1.0.0"
         self.TOTAL_MONTHLY_SESSIONS = 50
         self.REFRESH_INTERVAL_SECONDS = 1
+        self.IDLE_REFRESH_INTERVAL_SECONDS = 60
         self.CCUSAGE_FETCH_INTERVAL_SECONDS = 10
+        self.CCUSAGE_TIMEOUT_SECONDS = 60
+        # --recalculate streams the whole history, which may take much longer than one period
+        self.CCUSAGE_FULL_HISTORY_TIMEOUT_SECONDS = 600
+        # Fast-changing runtime state (e.g. max tokens) is written at most this often
+        self.STATE_FLUSH_INTERVAL_SECONDS = 30
+        # --recalculate reads ccusage output in chunks of this many characters
+        self.STREAM_CHUNK_CHARS = 64 * 1024
+        self.STREAM_BATCH_BLOCKS = 1000
+        # Change-driven fetching (used when the transcript directories can be watched)
+        self.WATCH_POLL_INTERVAL_SECONDS = 1
+        self.MIN_FETCH_INTERVAL_SECONDS = 2
+        self.MAX_FETCH_INTERVAL_SECONDS = 300
+        # Incremental fetches cover the open blocks plus this margin (whole days for ccusage -s)
+        self.DELTA_FETCH_MARGIN_HOURS = 24
         self.CONFIG_DIR = os.path.expanduser("~/.config/claude-monitor")
         self.CONFIG_FILE = os.path.join(self.CONFIG_DIR, "config.json")
+        self.HISTORY_DB_FILE = os.path.join(self.CONFIG_DIR, "history.db")
+        self.SOCKET_FILE = os.path.join(self.CONFIG_DIR, "monitor.sock")
+        self.STATUS_FILE = os.path.join(self.CONFIG_DIR, "status.json")
+        self.STATUS_WRITE_INTERVAL_SECONDS = 5
+        # Multi-profile mode (--profiles): per-profile state and the fetch pool size
+        self.PROFILES_DIR = os.path.join(self.CONFIG_DIR, "profiles")
+        self.PROFILE_FETCH_WORKERS = 4
+        
+        # One-shot status output (--once); an idle monitor rewrites its snapshot only once
+        # per IDLE_REFRESH_INTERVAL_SECONDS, so idle snapshots are trusted for that much longer
+        self.ONCE_MAX_SNAPSHOT_AGE_SECONDS = 30
+        self.ONCE_FETCH_TIMEOUT_SECONDS = 5
+        
+        # Instrumentation (--profile, --metrics-file)
+        self.METRICS_EXPORT_INTERVAL_SECONDS = 10
+        
+        # Token ceiling estimation (--ceiling): sketch accuracy/size and decayed-max half-life
+        self.CEILING_SKETCH_ACCURACY = 0.01
+        self.CEILING_SKETCH_MAX_BINS = 512
+        self.CEILING_HALF_LIFE_DAYS = 30
         
         # Alert Configuration (cross-platform)
         self.TIME_REMAINING_ALERT_MINUTES = 30
         self.INACTIVITY_ALERT_MINUTES = 10
+        self.NOTIFICATION_TIMEOUT_SECONDS = 5
+        self.NOTIFICATION_COALESCE_SECONDS = 0.5
+        self.NOTIFICATION_MIN_INTERVAL_SECONDS = 10
+        self.NOTIFICATION_DEDUP_SECONDS = 300
+        
+        # Burn-rate forecast: samples kept per session, their spacing and the rate window
+        self.BURN_RATE_SAMPLES = 64
+        self.BURN_RATE_SAMPLE_SECONDS = 15
+        self.BURN_RATE_WINDOW_MINUTES = 15
+        # Warn when the token limit is projected to be hit before the reset within this time
+        self.BURN_RATE_ALERT_MINUTES = 20
         
         # Time Zones
         self.UTC_TZ = ZoneInfo("UTC")
@@ -61,99 +113,409 @@ class Colors:
     ENDC = '\033[0m'
     BOLD = '\033[1m'
 
+# --- Instrumentation Singleton ---
+class _PhaseTimer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+class Metrics:
+    """Per-phase timings and gauges of the monitor, shared by the loop and the fetcher thread."""
+    _instance = None
+
+    # Phases shown by the --profile overlay, in display order
+    PHASES = ("fetch", "decode", "parse", "aggregate", "render", "persist", "store_write", "notify")
+    # Reference point of the startup gauges (time to first frame)
+    STARTED_AT = time.perf_counter()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance.last = {}
+            cls._instance.totals = {}
+            cls._instance.gauges = {}
+        return cls._instance
+
+    @classmethod
+    def instance(cls):
+        return cls()
+
+    def phase(self, name: str) -> _PhaseTimer:
+        """Context manager timing one run of a phase."""
+        return _PhaseTimer(self, name)
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self.last[name] = seconds
+            count, total = self.totals.get(name, (0, 0.0))
+            self.totals[name] = (count + 1, total + seconds)
+
+    def set_gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "phases": {name: {"last": self.last[name], "count": self.totals[name][0], "sum": self.totals[name][1]}
+                           for name in self.last},
+                "gauges": dict(self.gauges),
+            }
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = ["# HELP claude_monitor_phase_seconds Duration of monitor phases.",
+                 "# TYPE claude_monitor_phase_seconds summary"]
+        for name, phase in sorted(snapshot["phases"].items()):
+            lines.append(f'claude_monitor_phase_seconds_sum{{phase="{name}"}} {phase["sum"]:.6f}')
+            lines.append(f'claude_monitor_phase_seconds_count{{phase="{name}"}} {phase["count"]}')
+        lines += ["# HELP claude_monitor_phase_last_seconds Duration of the latest run of each phase.",
+                  "# TYPE claude_monitor_phase_last_seconds gauge"]
+        for name, phase in sorted(snapshot["phases"].items()):
+            lines.append(f'claude_monitor_phase_last_seconds{{phase="{name}"}} {phase["last"]:.6f}')
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append(f"# TYPE claude_monitor_{name} gauge")
+            lines.append(f"claude_monitor_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_line(self) -> str:
+        return json.dumps(self.snapshot())
+
+    def export(self, path: str):
+        """Write Prometheus text to a `.prom` file (replaced atomically), else append a JSON line."""
+        if path.endswith(".prom"):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        else:
+            with open(path, 'a') as f:
+                f.write(self.to_json_line() + "\n")
+
 # --- Helper Functions ---
 
-def show_notification(title, message):
-    """Cross-platform notification function supporting macOS, Linux, and Windows"""
+# --- Notifications ---
+
+class CommandBackend:
+    """Sends notifications by running a desktop notification command."""
+
+    def __init__(self, name: str, build_command):
+        self.name = name
+        self.build_command = build_command
+
+    def send(self, title: str, message: str, timeout: float = None):
+        import subprocess
+        subprocess.run(self.build_command(title, message), check=True, capture_output=True, text=True,
+                       timeout=timeout)
+
+class RecordingBackend:
+    """Collects notifications in memory instead of showing them (tests, --replay)."""
+    name = "recording"
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, title: str, message: str, timeout: float = None):
+        self.sent.append((title, message))
+
+def _powershell_toast_command(title, message):
+    # Try using Windows toast notifications via powershell
+    script = f'''
+    [Windows.UI.Notifications.ToastNotificationManager, Windows.UI.Notifications, ContentType = WindowsRuntime] | Out-Null
+    [Windows.UI.Notifications.ToastNotification, Windows.UI.Notifications, ContentType = WindowsRuntime] | Out-Null
+    [Windows.Data.Xml.Dom.XmlDocument, Windows.Data.Xml.Dom.XmlDocument, ContentType = WindowsRuntime] | Out-Null
     
+    $template = @"
+    <toast>
+        <visual>
+            <binding template="ToastText02">
+                <text id="1">{title}</text>
+                <text id="2">{message}</text>
+            </binding>
+        </visual>
+    </toast>
+"@
+    
+    $xml = New-Object Windows.Data.Xml.Dom.XmlDocument
+    $xml.LoadXml($template)
+    $toast = New-Object Windows.UI.Notifications.ToastNotification $xml
+    [Windows.UI.Notifications.ToastNotificationManager]::CreateToastNotifier("Claude Monitor").Show($toast)
+    '''
+    return ["powershell", "-Command", script]
+
+_notification_backends = None
+
+def get_notification_backends() -> list:
+    """Detect the usable notification commands once and cache them, best first."""
+    global _notification_backends
+    if _notification_backends is not None:
+        return _notification_backends
+    backends = []
     # macOS notifications
     if sys.platform == "darwin":
         # Try terminal-notifier first (better notifications)
         if shutil.which("terminal-notifier"):
-            try:
-                command = ["terminal-notifier", "-title", title, "-message", message, "-sound", "default"]
-                subprocess.run(command, check=True, capture_output=True, text=True)
-                return
-            except (subprocess.CalledProcessError, FileNotFoundError): 
-                pass
-        
+            backends.append(CommandBackend("terminal-notifier", lambda title, message: [
+                "terminal-notifier", "-title", title, "-message", message, "-sound", "default"]))
         # Fallback to osascript
-        try:
-            script = f'display notification "{message}" with title "{title}"'
-            subprocess.run(["osascript", "-e", script], check=True, capture_output=True, text=True)
-            return
-        except (subprocess.CalledProcessError, FileNotFoundError): 
-            pass
-    
+        backends.append(CommandBackend("osascript", lambda title, message: [
+            "osascript", "-e", f'display notification "{message}" with title "{title}"']))
     # Linux notifications
     elif sys.platform.startswith("linux"):
         # Try notify-send (most common Linux notification system)
         if shutil.which("notify-send"):
-            try:
-                command = ["notify-send", title, message, "--urgency=normal"]
-                subprocess.run(command, check=True, capture_output=True, text=True)
-                return
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                pass
-        
+            backends.append(CommandBackend("notify-send", lambda title, message: [
+                "notify-send", title, message, "--urgency=normal"]))
         # Try dunst notification (common in tiling window managers)
         if shutil.which("dunstify"):
-            try:
-                command = ["dunstify", "-u", "normal", title, message]
-                subprocess.run(command, check=True, capture_output=True, text=True)
-                return
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                pass
-    
+            backends.append(CommandBackend("dunstify", lambda title, message: [
+                "dunstify", "-u", "normal", title, message]))
     # Windows notifications
     elif sys.platform == "win32":
-        try:
-            # Try using Windows toast notifications via powershell
-            script = f'''
-            [Windows.UI.Notifications.ToastNotificationManager, Windows.UI.Notifications, ContentType = WindowsRuntime] | Out-Null
-            [Windows.UI.Notifications.ToastNotification, Windows.UI.Notifications, ContentType = WindowsRuntime] | Out-Null
-            [Windows.Data.Xml.Dom.XmlDocument, Windows.Data.Xml.Dom.XmlDocument, ContentType = WindowsRuntime] | Out-Null
-            
-            $template = @"
-            <toast>
-                <visual>
-                    <binding template="ToastText02">
-                        <text id="1">{title}</text>
-                        <text id="2">{message}</text>
-                    </binding>
-                </visual>
-            </toast>
-"@
-            
-            $xml = New-Object Windows.Data.Xml.Dom.XmlDocument
-            $xml.LoadXml($template)
-            $toast = New-Object Windows.UI.Notifications.ToastNotification $xml
-            [Windows.UI.Notifications.ToastNotificationManager]::CreateToastNotifier("Claude Monitor").Show($toast)
-            '''
-            subprocess.run(["powershell", "-Command", script], check=True, capture_output=True, text=True)
-            return
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            pass
-    
+        backends.append(CommandBackend("powershell", _powershell_toast_command))
+    _notification_backends = backends
+    return backends
+
+def show_notification(title, message, backends: list = None, timeout: float = None):
+    """Cross-platform notification function supporting macOS, Linux, and Windows.
+
+    Returns the name of the backend that delivered the notification, or None.
+    """
+    import subprocess
+    if timeout is None:
+        timeout = Config.instance().NOTIFICATION_TIMEOUT_SECONDS
+    with Metrics.instance().phase("notify"):
+        for backend in (get_notification_backends() if backends is None else backends):
+            try:
+                backend.send(title, message, timeout)
+                return backend.name
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
+                continue
     # If all notification methods fail, silently continue
     # This ensures the monitor continues working even without notifications
+    return None
+
+class NotificationDispatcher:
+    """Delivers alerts from a worker thread so a slow notification daemon never stalls the display.
+
+    Alerts raised close together are merged into one notification, an identical alert
+    repeated within NOTIFICATION_DEDUP_SECONDS is dropped, and consecutive notifications
+    are at least NOTIFICATION_MIN_INTERVAL_SECONDS apart. The windows are measured on the
+    module clock; `time_scale` is how many clock seconds pass per real second (--replay).
+    """
+
+    def __init__(self, backends: list = None, title: str = "Claude Monitor", time_scale: float = 1.0):
+        import queue
+        config = Config.instance()
+        self.backends = backends
+        self.title = title
+        self.coalesce_window = config.NOTIFICATION_COALESCE_SECONDS
+        self.min_interval = config.NOTIFICATION_MIN_INTERVAL_SECONDS
+        self.dedup_window = config.NOTIFICATION_DEDUP_SECONDS
+        self.time_scale = time_scale
+        self._queue = queue.Queue()
+        self._empty = queue.Empty
+        self._recent = {}
+        self._last_sent = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+            self._thread.start()
+        return self
+
+    def notify(self, message: str):
+        """Queue an alert; returns immediately."""
+        self._queue.put(message)
+
+    def close(self, timeout: float = None):
+        """Deliver what is still queued, then stop the worker."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                return
+            pending, stopping = [message], False
+            # Wait out the rate limit (at least the coalescing window), merging anything that arrives
+            delay = self.coalesce_window
+            if self._last_sent is not None:
+                delay = max(delay, self._last_sent + self.min_interval - time.monotonic())
+            deadline = time.monotonic() + delay
+            while not stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    message = self._queue.get(timeout=remaining / self.time_scale)
+                except self._empty:
+                    continue
+                if message is None:
+                    stopping = True
+                else:
+                    pending.append(message)
+            self._deliver(pending)
+            if stopping:
+                return
+
+    def _deliver(self, messages: list):
+        now = time.monotonic()
+        unique = []
+        for message in messages:
+            if message in unique or now - self._recent.get(message, -self.dedup_window) < self.dedup_window:
+                continue
+            unique.append(message)
+        if not unique:
+            return
+        for message in unique:
+            self._recent[message] = now
+        show_notification(self.title, "\n".join(unique), self.backends)
+        self._last_sent = time.monotonic()
+
+class FrameRenderer:
+    """Draws frames built as lists of lines, rewriting only the lines that changed.
 
-def clear_screen_for_refresh():
-    print("\033[H\033[J\033[?25l", end="")
+    The whole update goes out in a single write, which avoids the flicker of
+    clearing and reprinting the screen every refresh. Lines are clipped to the
+    terminal width, since a wrapped line would be overwritten by the next row.
+    """
+
+    ESCAPE = re.compile(r"\033\[[0-9;?]*[A-Za-z]")
+
+    def __init__(self, stream=None):
+        import unicodedata
+        self.stream = stream or sys.stdout
+        self._previous = None
+        self._size = None
+        self._east_asian_width = unicodedata.east_asian_width
+        self._combining = unicodedata.combining
+
+    def invalidate(self):
+        """Force a full redraw on the next frame (e.g. after a terminal resize)."""
+        self._previous = None
+
+    def draw(self, lines: list) -> bool:
+        size = shutil.get_terminal_size()
+        if size != self._size:
+            self._size = size
+            self._previous = None
+        lines = [self.clip(line, size.columns) for line in lines]
+        output = []
+        previous = self._previous
+        if previous is None:
+            output.append("\033[H\033[J\033[?25l")  # Clear screen, hide cursor
+            previous = []
+        for row, line in enumerate(lines):
+            if row < len(previous) and previous[row] == line:
+                continue
+            output.append(f"\033[{row + 1};1H{line}\033[K")
+        if len(lines) < len(previous):
+            output.append(f"\033[{len(lines) + 1};1H\033[J")
+        self._previous = list(lines)
+        if not output:
+            return False
+        self.stream.write("".join(output))
+        self.stream.flush()
+        return True
+
+    def clip(self, line: str, width: int) -> str:
+        """Cut `line` to `width` columns: escape sequences take none, wide characters and emoji two."""
+        if len(line) * 2 <= width:
+            return line
+        columns = 0
+        position = 0
+        while position < len(line):
+            char = line[position]
+            if char == "\033":
+                match = self.ESCAPE.match(line, position)
+                if match:
+                    position = match.end()
+                    continue
+            if self._combining(char) or char in "\u200d\ufe0e\ufe0f":
+                char_width = 0
+            elif self._east_asian_width(char) in "WF" or line[position + 1:position + 2] == "\ufe0f":
+                char_width = 2
+            else:
+                char_width = 1
+            if columns + char_width > width:
+                return line[:position] + Colors.ENDC
+            columns += char_width
+            position += 1
+        return line
+
+    def close(self):
+        """Move the cursor below the last frame and show it again."""
+        rows = len(self._previous) if self._previous else 0
+        self.stream.write(f"\033[{rows + 1};1H\033[?25h")
+        self.stream.flush()
 
 def parse_utc_time(time_str: str) -> datetime:
     config = Config.instance()
     time_str = time_str.split('.')[0]
     return datetime.strptime(time_str, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=config.UTC_TZ)
 
+def parse_utc_epoch(time_str: str) -> float:
+    """Fast parse of a ccusage UTC timestamp into epoch seconds."""
+    return datetime.fromisoformat(time_str[:19]).replace(tzinfo=Config.instance().UTC_TZ).timestamp()
+
+class FileLock:
+    """Exclusive advisory lock held through a `with` block (flock; a no-op where fcntl is unavailable)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        try:
+            import fcntl
+        except ImportError:
+            return self
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._fd is not None:
+            # Closing the descriptor releases the lock
+            os.close(self._fd)
+            self._fd = None
+
 def save_config(data: dict):
     config = Config.instance()
     try:
         os.makedirs(config.CONFIG_DIR, exist_ok=True)
-        with open(config.CONFIG_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
+        with Metrics.instance().phase("persist"):
+            write_json_atomic(config.CONFIG_FILE, data, durable=True, indent=2)
     except IOError: pass
 
+def update_config(change) -> dict:
+    """Apply `change` to the saved config and write it back; returns the new config.
+
+    The config lock is held from read to rename, so monitors sharing the directory
+    cannot lose each other's updates.
+    """
+    config = Config.instance()
+    os.makedirs(config.CONFIG_DIR, exist_ok=True)
+    with FileLock(config.CONFIG_FILE + ".lock"):
+        data = load_config()
+        change(data)
+        save_config(data)
+    return data
+
 def load_config() -> dict:
     config = Config.instance()
     default_config = {
@@ -166,11 +528,44 @@ def load_config() -> dict:
     try:
         with open(config.CONFIG_FILE, 'r') as f:
             loaded_config = json.load(f)
-            # Ensure user_settings exists
-            if "user_settings" not in loaded_config:
-                loaded_config["user_settings"] = default_config["user_settings"]
-            return loaded_config
-    except (IOError, json.JSONDecodeError): return default_config
+        if not isinstance(loaded_config, dict):
+            raise ValueError("expected a JSON object")
+    except IOError: return default_config
+    except ValueError as e:
+        # Keep the damaged file for inspection instead of silently overwriting it later
+        backup = f"{config.CONFIG_FILE}.corrupt-{int(time.time())}"
+        try:
+            os.replace(config.CONFIG_FILE, backup)
+        except OSError:
+            backup = None
+        moved = f"moved to {backup}" if backup else "left in place"
+        print(f"{Colors.WARNING}Warning: {config.CONFIG_FILE} is unreadable ({e}); {moved}, "
+              f"using default settings.{Colors.ENDC}", file=sys.stderr)
+        return default_config
+    # Ensure user_settings exists
+    if "user_settings" not in loaded_config:
+        loaded_config["user_settings"] = default_config["user_settings"]
+    return loaded_config
+
+def write_json_atomic(path: str, data, durable: bool = False, indent: int = None):
+    """Write JSON to a temp file and rename it over `path`, so readers never see a partial file.
+
+    With `durable`, the data and the rename are fsynced, so a crash leaves either the old
+    or the new file on disk.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if durable and os.name == 'posix':
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
 
 def safe_replace_day(target_date: date, day: int) -> date:
     """Safely replace the day of a date, handling month overflow (e.g., Feb 30 -> Feb 28/29)"""
@@ -181,23 +576,703 @@ def safe_replace_day(target_date: date, day: int) -> date:
         last_day = calendar.monthrange(target_date.year, target_date.month)[1]
         return target_date.replace(day=last_day)
 
-def run_ccusage(since_date: str = None) -> dict:
+def run_ccusage(since_date: str = None, timeout: float = None, env: dict = None) -> dict:
+    import subprocess
     command = ["ccusage", "blocks", "-j"]
     if since_date: command.extend(["-s", since_date])
+    metrics = Metrics.instance()
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return json.loads(result.stdout)
-    except (FileNotFoundError, subprocess.CalledProcessError, json.JSONDecodeError):
+        with metrics.phase("fetch"):
+            result = subprocess.run(command, capture_output=True, text=True, check=True, timeout=timeout, env=env)
+        metrics.set_gauge("payload_bytes", len(result.stdout))
+        with metrics.phase("decode"):
+            return json.loads(result.stdout)
+    except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired, json.JSONDecodeError):
         return {"blocks": []}
 
+def stream_ccusage(since_date: str = None, timeout: float = None):
+    """Yield `ccusage blocks -j` output in chunks as it arrives. Raises OSError if ccusage fails."""
+    import subprocess
+    command = ["ccusage", "blocks", "-j"]
+    if since_date: command.extend(["-s", since_date])
+    metrics = Metrics.instance()
+    chunk_chars = Config.instance().STREAM_CHUNK_CHARS
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    timer = threading.Timer(timeout, process.kill) if timeout else None
+    if timer: timer.start()
+    received = 0
+    try:
+        while True:
+            chunk = process.stdout.read(chunk_chars)
+            if not chunk:
+                break
+            received += len(chunk)
+            yield chunk
+    finally:
+        if timer: timer.cancel()
+        process.stdout.close()
+        returncode = process.wait()
+        metrics.observe("fetch", time.perf_counter() - started)
+        metrics.set_gauge("payload_bytes", received)
+    if returncode != 0:
+        raise OSError(f"ccusage exited with status {returncode}")
+
+def iter_json_array(chunks, key: str):
+    """Yield the objects of the top-level `key` array of a JSON document arriving in text chunks.
+
+    Only the item being decoded and one chunk of lookahead are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, in_array = "", 0, False
+    for chunk in chunks:
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        if not in_array:
+            key_at = buffer.find(f'"{key}"')
+            bracket = buffer.find('[', key_at) if key_at >= 0 else -1
+            if bracket < 0:
+                continue
+            pos, in_array = bracket + 1, True
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                break
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # The item continues in the next chunk
+            yield item
+
+def iter_ccusage_blocks(since_date: str = None, timeout: float = None):
+    """Yield the non-gap blocks reported by ccusage one at a time, without loading the whole output."""
+    for block in iter_json_array(stream_ccusage(since_date, timeout), "blocks"):
+        if not block.get("isGap", False):
+            yield Block.from_dict(block)
+
+class Block:
+    """A session block with timestamps pre-parsed to epoch seconds."""
+    __slots__ = ("id", "start", "end", "total_tokens", "cost_usd", "is_active", "last_activity")
+
+    def __init__(self, id: str, start: float, end: float, total_tokens: int, cost_usd: float, is_active: bool,
+                 last_activity: float = None):
+        self.id = id
+        self.start = start
+        self.end = end
+        self.total_tokens = total_tokens
+        self.cost_usd = cost_usd
+        self.is_active = is_active
+        self.last_activity = last_activity
+
+    @classmethod
+    def from_dict(cls, block: dict):
+        actual_end = block.get("actualEndTime")
+        return cls(block["id"], parse_utc_epoch(block["startTime"]), parse_utc_epoch(block["endTime"]),
+                   block.get("totalTokens", 0), block.get("costUSD", 0), block.get("isActive", False),
+                   parse_utc_epoch(actual_end) if actual_end else None)
+
+class BlockIndex:
+    """Non-gap blocks sorted by start time, built once per fetch.
+
+    Blocks never overlap, so the only candidate for "active at t" is the last block
+    starting at or before t, found by bisection.
+    """
+    __slots__ = ("blocks", "starts")
+
+    def __init__(self, blocks: list = ()):
+        self.blocks = sorted(blocks, key=lambda b: b.start)
+        self.starts = [b.start for b in self.blocks]
+
+    @classmethod
+    def spliced(cls, previous, start: float, new_blocks: list):
+        """Keep `previous` blocks starting before `start` and append the (sorted) `new_blocks`."""
+        index = cls.__new__(cls)
+        keep = bisect.bisect_left(previous.starts, start)
+        index.blocks = previous.blocks[:keep] + new_blocks
+        index.starts = previous.starts[:keep] + [b.start for b in new_blocks]
+        return index
+
+    @classmethod
+    def from_data(cls, data: dict):
+        return cls(Block.from_dict(b) for b in data.get("blocks", []) if not b.get("isGap", False))
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def find_active(self, now: float):
+        index = bisect.bisect_right(self.starts, now) - 1
+        if index >= 0 and now <= self.blocks[index].end:
+            return self.blocks[index]
+        return None
+
+    def since(self, start: float) -> list:
+        """Return blocks starting at or after `start`."""
+        return self.blocks[bisect.bisect_left(self.starts, start):]
+
+    def max_tokens(self) -> int:
+        return max((b.total_tokens for b in self.blocks), default=0)
+
+def merge_blocks(old_blocks: list, fresh_blocks: list):
+    """Splice a delta fetch onto the blocks seen before.
+
+    `ccusage -s` rebuilds blocks from the filtered entries only, so the first fresh
+    blocks may be truncated copies of older ones. The two lists are joined at the
+    earliest non-gap block present in both; from there on the fresh data wins.
+    Returns (merged blocks, index of the first fresh block in them), or None when
+    the lists do not overlap.
+    """
+    fresh_positions = {b["id"]: j for j, b in enumerate(fresh_blocks) if not b.get("isGap", False)}
+    if not fresh_positions:
+        return None
+    first_fresh_start = fresh_blocks[0]["startTime"]
+    match = None
+    i = len(old_blocks) - 1
+    # Only the tail of the old list can overlap the fresh window
+    while i >= 0 and old_blocks[i]["startTime"] >= first_fresh_start:
+        if old_blocks[i]["id"] in fresh_positions:
+            match = i
+        i -= 1
+    if match is None:
+        return None
+    return old_blocks[:match] + fresh_blocks[fresh_positions[old_blocks[match]["id"]]:], match
+
+class UsageSnapshot:
+    """Immutable result of one successful fetch."""
+    __slots__ = ("data", "blocks", "fetched_at")
+
+    def __init__(self, data: dict, fetched_at: float, blocks: BlockIndex = None):
+        metrics = Metrics.instance()
+        self.data = data
+        with metrics.phase("parse"):
+            self.blocks = blocks if blocks is not None else BlockIndex.from_data(data)
+        metrics.set_gauge("blocks", len(self.blocks))
+        self.fetched_at = fetched_at
+
+    def age(self, now: float = None) -> float:
+        return (now if now is not None else time.time()) - self.fetched_at
+
+class UsageFetcher:
+    """Runs ccusage on a worker thread and publishes the latest good snapshot.
+
+    A single worker performs every fetch, so two ccusage processes never run at
+    the same time. Readers call latest() and never block on the subprocess.
+    An alternative `source` callable (e.g. TranscriptReader.fetch) may replace ccusage;
+    it returns the ccusage-shaped data, or (data, BlockIndex) when it has the index at hand.
+
+    With a TranscriptWatcher, fetches are change-driven: the worker fetches when the
+    transcripts change or the active block ends, instead of every `interval` seconds.
+    """
+
+    def __init__(self, since_date: str = None, interval: float = None, timeout: float = None, source=None,
+                 on_change=None, watcher=None, env: dict = None, recorder=None):
+        config = Config.instance()
+        self.since_date = since_date
+        self.source = source
+        self.env = env
+        self.recorder = recorder
+        self.on_change = on_change
+        self.watcher = watcher
+        self.interval = interval if interval is not None else config.CCUSAGE_FETCH_INTERVAL_SECONDS
+        self.timeout = timeout if timeout is not None else config.CCUSAGE_TIMEOUT_SECONDS
+        self._snapshot = None
+        self._verified_at = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="usage-fetcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def refresh(self):
+        """Ask the worker to fetch now instead of waiting for the next interval."""
+        self._wake.set()
+
+    def take_refresh(self) -> bool:
+        """Return True once after refresh(); for schedulers that call fetch_once() themselves."""
+        if self._wake.is_set():
+            self._wake.clear()
+            return True
+        return False
+
+    def latest(self):
+        """Return the last successful UsageSnapshot, or None before the first one."""
+        return self._snapshot
+
+    def data_age(self, now: float = None):
+        """Seconds since the data was last fetched or confirmed unchanged by the watcher."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        now = now if now is not None else time.time()
+        return now - max(snapshot.fetched_at, self._verified_at)
+
+    def fetch_once(self):
+        previous = self._snapshot
+        blocks = None
+        if self.source is not None:
+            data = self.source()
+            if isinstance(data, tuple):
+                data, blocks = data
+        else:
+            data, blocks = self._fetch_ccusage(previous)
+        if data and data.get("blocks"):
+            # Rebinding a single attribute is atomic, so readers always see a complete snapshot
+            self._snapshot = UsageSnapshot(data, time.time(), blocks)
+            if (self.on_change or self.recorder) and (previous is None or previous.data != data):
+                if self.recorder:
+                    self.recorder.record(self._snapshot.fetched_at, data)
+                if self.on_change:
+                    self.on_change()
+        return self._snapshot
+
+    def _fetch_ccusage(self, previous):
+        """Fetch only the window that can still change and merge it into the previous snapshot.
+
+        Returns (data, BlockIndex or None when the index must be built from scratch).
+        """
+        since = self._delta_since(previous)
+        data = run_ccusage(since, timeout=self.timeout, env=self.env)
+        if since == self.since_date or not data.get("blocks"):
+            return data, None
+        merged = merge_blocks(previous.data["blocks"], data["blocks"])
+        if merged is None:
+            # The delta window does not overlap what we have: refetch the whole period
+            return run_ccusage(self.since_date, timeout=self.timeout, env=self.env), None
+        merged_blocks, fresh_start = merged
+        new_blocks = BlockIndex.from_data({"blocks": merged_blocks[fresh_start:]}).blocks
+        if not new_blocks:
+            return {"blocks": merged_blocks}, None
+        return {"blocks": merged_blocks}, BlockIndex.spliced(previous.blocks, new_blocks[0].start, new_blocks)
+
+    def _delta_since(self, previous):
+        """ccusage -s date for the next fetch: the earliest still-open block minus a safety margin."""
+        if previous is None or not previous.blocks:
+            return self.since_date
+        blocks = previous.blocks.blocks
+        open_starts = [b.start for b in blocks[-3:] if b.is_active]
+        # With nothing open, new blocks can only follow the latest one
+        anchor = min(open_starts) if open_starts else blocks[-1].start
+        margin = Config.instance().DELTA_FETCH_MARGIN_HOURS * 3600
+        # ccusage interprets -s in the system's local time
+        since = datetime.fromtimestamp(anchor - margin).strftime('%Y%m%d')
+        return max(since, self.since_date) if self.since_date else since
+
+    def _run(self):
+        while not self._stop.is_set():
+            fetched_at = time.monotonic()
+            self.fetch_once()
+            if self.watcher is None:
+                self._wake.wait(self.interval)
+            else:
+                self._wait_for_change(fetched_at)
+            self._wake.clear()
+        if self.watcher is not None:
+            self.watcher.close()
+
+    def _wait_for_change(self, fetched_at: float):
+        config = Config.instance()
+        # Never fetch more often than MIN_FETCH_INTERVAL_SECONDS, even under constant writes
+        if self._wake.wait(max(0.0, fetched_at + config.MIN_FETCH_INTERVAL_SECONDS - time.monotonic())):
+            return
+        snapshot = self._snapshot
+        active = snapshot.blocks.find_active(time.time()) if snapshot is not None else None
+        boundary = active.end if active is not None else None
+        while not self._stop.is_set():
+            if self.watcher.changed():
+                return
+            now = time.time()
+            self._verified_at = now
+            if boundary is not None and now >= boundary:
+                return
+            # Safety net for changes a watcher cannot see (e.g. data outside the watched dirs)
+            if time.monotonic() - fetched_at >= config.MAX_FETCH_INTERVAL_SECONDS:
+                return
+            if self._wake.wait(config.WATCH_POLL_INTERVAL_SECONDS):
+                return
+
+# --- Native Transcript Reader ---
+
+SESSION_DURATION_SECONDS = 5 * 3600
+
+# Approximate USD prices per million tokens: (input, output, cache write, cache read).
+# Only used for transcript entries that do not carry their own costUSD.
+MODEL_PRICING = (
+    ("opus-4-5", (5.0, 25.0, 6.25, 0.50)),
+    ("opus", (15.0, 75.0, 18.75, 1.50)),
+    ("sonnet", (3.0, 15.0, 3.75, 0.30)),
+    ("haiku-4-5", (1.0, 5.0, 1.25, 0.10)),
+    ("3-5-haiku", (0.80, 4.0, 1.0, 0.08)),
+    ("haiku", (0.25, 1.25, 0.30, 0.03)),
+)
+
+def get_claude_data_dirs() -> list:
+    """Return the Claude data directories ccusage would read (CLAUDE_CONFIG_DIR aware)."""
+    env_dirs = os.environ.get("CLAUDE_CONFIG_DIR", "").strip()
+    if env_dirs:
+        candidates = [os.path.expanduser(d.strip()) for d in env_dirs.split(",") if d.strip()]
+    else:
+        candidates = [os.path.expanduser("~/.config/claude"), os.path.expanduser("~/.claude")]
+    return [d for d in candidates if os.path.isdir(os.path.join(d, "projects"))]
+
+def estimate_cost(model: str, usage: dict) -> float:
+    model = model or ""
+    for pattern, prices in MODEL_PRICING:
+        if pattern in model:
+            input_price, output_price, cache_write_price, cache_read_price = prices
+            return (usage.get("input_tokens", 0) * input_price
+                    + usage.get("output_tokens", 0) * output_price
+                    + usage.get("cache_creation_input_tokens", 0) * cache_write_price
+                    + usage.get("cache_read_input_tokens", 0) * cache_read_price) / 1_000_000
+    return 0.0
+
+def format_utc_iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, Config.instance().UTC_TZ).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+class _TranscriptFile:
+    __slots__ = ("inode", "offset")
+
+    def __init__(self, inode: int):
+        self.inode = inode
+        self.offset = 0
+
+class _NativeBlock:
+    # `formatted` caches the (record, Block) pairs of a completed block and its preceding gap
+    __slots__ = ("start", "first_index", "first_ts", "last_ts", "tokens", "cost", "entries", "formatted")
+
+    def __init__(self, start: float, first_index: int, first_ts: float):
+        self.start = start
+        self.first_index = first_index
+        self.first_ts = first_ts
+        self.last_ts = first_ts
+        self.tokens = 0
+        self.cost = 0.0
+        self.entries = 0
+        self.formatted = None
+
+class TranscriptReader:
+    """In-process replacement for `ccusage blocks -j` built on the transcript JSONL files.
+
+    Remembers the inode and byte offset of every file, so each poll parses only the
+    lines appended since the previous one and extends the 5-hour blocks in place.
+    Completed blocks are formatted and parsed once and reused by later polls.
+    """
+
+    def __init__(self, data_dirs: list = None, since_date: str = None):
+        self.data_dirs = data_dirs if data_dirs is not None else get_claude_data_dirs()
+        self.since_epoch = None
+        if since_date:
+            since = datetime.strptime(since_date, '%Y%m%d').replace(tzinfo=Config.instance().LOCAL_TZ)
+            self.since_epoch = since.timestamp()
+        self._files = {}
+        self._seen = set()
+        # Entries sorted by timestamp, stored column-wise
+        self._ts = []
+        self._tokens = []
+        self._costs = []
+        self._blocks = []
+
+    def fetch(self) -> dict:
+        with Metrics.instance().phase("fetch"):
+            self.poll()
+        return self.blocks()
+
+    def fetch_indexed(self):
+        """fetch() plus the BlockIndex of its blocks, for UsageFetcher sources."""
+        with Metrics.instance().phase("fetch"):
+            self.poll()
+        formatted = self._formatted()
+        return ({"blocks": [record for record, _ in formatted]},
+                BlockIndex(block for _, block in formatted if block is not None))
+
+    def poll(self) -> int:
+        """Read newly appended transcript lines and update the blocks. Returns the number of new entries."""
+        new_entries = []
+        for path in self._iter_files():
+            new_entries.extend(self._read_new_lines(path))
+        if new_entries:
+            self._add_entries(new_entries)
+        return len(new_entries)
+
+    def blocks(self, now: float = None) -> dict:
+        return {"blocks": [record for record, _ in self._formatted(now)]}
+
+    def _formatted(self, now: float = None) -> list:
+        """(ccusage record, Block or None for gaps) pairs of all blocks, oldest first."""
+        now = now if now is not None else time.time()
+        result = []
+        previous = None
+        for block in self._blocks:
+            formatted = block.formatted
+            if formatted is None:
+                formatted = self._format_block(block, previous, now)
+                if not formatted[-1][0]["isActive"]:
+                    # Only new entries change a completed block, and _extend_blocks() drops this
+                    block.formatted = formatted
+            result.extend(formatted)
+            previous = block
+        return result
+
+    @staticmethod
+    def _format_block(block: _NativeBlock, previous: _NativeBlock, now: float) -> list:
+        formatted = []
+        if previous is not None and block.first_ts - previous.last_ts > SESSION_DURATION_SECONDS:
+            gap_start = previous.last_ts + SESSION_DURATION_SECONDS
+            formatted.append(({
+                "id": f"gap-{format_utc_iso(gap_start)}",
+                "startTime": format_utc_iso(gap_start),
+                "endTime": format_utc_iso(block.first_ts),
+                "isActive": False, "isGap": True,
+                "entries": 0, "totalTokens": 0, "costUSD": 0.0,
+            }, None))
+        end = block.start + SESSION_DURATION_SECONDS
+        record = {
+            "id": format_utc_iso(block.start),
+            "startTime": format_utc_iso(block.start),
+            "endTime": format_utc_iso(end),
+            "actualEndTime": format_utc_iso(block.last_ts),
+            "isActive": now - block.last_ts < SESSION_DURATION_SECONDS and now < end,
+            "isGap": False,
+            "entries": block.entries,
+            "totalTokens": block.tokens,
+            "costUSD": block.cost,
+        }
+        formatted.append((record, Block.from_dict(record)))
+        return formatted
+
+    def _iter_files(self):
+        for data_dir in self.data_dirs:
+            for root, _, files in os.walk(os.path.join(data_dir, "projects")):
+                for name in files:
+                    if name.endswith(".jsonl"):
+                        yield os.path.join(root, name)
+
+    def _read_new_lines(self, path: str) -> list:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return []
+        state = self._files.get(path)
+        if state is None or state.inode != stat.st_ino or stat.st_size < state.offset:
+            # New, replaced or truncated file; duplicates are filtered by message id
+            state = self._files[path] = _TranscriptFile(stat.st_ino)
+        if stat.st_size == state.offset:
+            return []
+        try:
+            with open(path, 'rb') as f:
+                f.seek(state.offset)
+                chunk = f.read()
+        except OSError:
+            return []
+        # Leave a partially written last line for the next poll
+        end = chunk.rfind(b"\n") + 1
+        state.offset += end
+        entries = []
+        for line in chunk[:end].splitlines():
+            entry = self._parse_line(line)
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def _parse_line(self, line: bytes):
+        if b'"usage"' not in line:
+            return None
+        try:
+            record = json.loads(line)
+            message = record["message"]
+            usage = message["usage"]
+            timestamp = datetime.fromisoformat(record["timestamp"].replace("Z", "+00:00")).timestamp()
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+        if self.since_epoch is not None and timestamp < self.since_epoch:
+            return None
+        message_id, request_id = message.get("id"), record.get("requestId")
+        if message_id and request_id:
+            key = f"{message_id}:{request_id}"
+            if key in self._seen:
+                return None
+            self._seen.add(key)
+        tokens = (usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+                  + usage.get("cache_creation_input_tokens", 0) + usage.get("cache_read_input_tokens", 0))
+        cost = record.get("costUSD")
+        if cost is None:
+            cost = estimate_cost(message.get("model"), usage)
+        return (timestamp, tokens, cost)
+
+    def _add_entries(self, entries: list):
+        entries.sort()
+        replay_from = len(self._ts)
+        if self._ts and entries[0][0] < self._ts[-1]:
+            # Out-of-order data: rebuild from the block that contains the oldest new entry
+            starts = [b.start for b in self._blocks]
+            index = bisect.bisect_right(starts, entries[0][0]) - 1
+            # The oldest new entry may precede the first entry of its block
+            replay_ts = min(self._blocks[index].first_ts, entries[0][0]) if index >= 0 else entries[0][0]
+            del self._blocks[max(index, 0):]
+            for entry in entries:
+                position = bisect.bisect_right(self._ts, entry[0])
+                self._ts.insert(position, entry[0])
+                self._tokens.insert(position, entry[1])
+                self._costs.insert(position, entry[2])
+            replay_from = bisect.bisect_left(self._ts, replay_ts)
+        else:
+            for timestamp, tokens, cost in entries:
+                self._ts.append(timestamp)
+                self._tokens.append(tokens)
+                self._costs.append(cost)
+        for index in range(replay_from, len(self._ts)):
+            self._extend_blocks(index)
+
+    def _extend_blocks(self, index: int):
+        timestamp = self._ts[index]
+        block = self._blocks[-1] if self._blocks else None
+        if (block is None or timestamp - block.start > SESSION_DURATION_SECONDS
+                or timestamp - block.last_ts > SESSION_DURATION_SECONDS):
+            # Blocks start on the full hour of their first entry, like ccusage
+            block = _NativeBlock(timestamp - timestamp % 3600, index, timestamp)
+            self._blocks.append(block)
+        block.last_ts = timestamp
+        block.formatted = None
+        block.tokens += self._tokens[index]
+        block.cost += self._costs[index]
+        block.entries += 1
+
+# --- Transcript Change Detection ---
+
+class _Inotify:
+    """Minimal ctypes binding to Linux inotify, watching a directory tree."""
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, roots: list):
+        import ctypes
+        import struct
+        self._struct = struct
+        self._libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths = {}
+        for root in roots:
+            for directory, _, _ in os.walk(root):
+                self._add_watch(directory)
+
+    def _add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd >= 0:
+            self._paths[wd] = directory
+
+    def read_events(self) -> bool:
+        """Drain pending events. Returns True if anything changed."""
+        changed = False
+        while True:
+            try:
+                buffer = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = self._struct.unpack_from("iIII", buffer, offset)
+                name = buffer[offset + 16:offset + 16 + length].rstrip(b"\0")
+                offset += 16 + length
+                if mask & self.IN_ISDIR:
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO) and wd in self._paths:
+                        # New project directory: watch it (and anything created inside already)
+                        for directory, _, _ in os.walk(os.path.join(self._paths[wd], os.fsdecode(name))):
+                            self._add_watch(directory)
+                        changed = True
+                elif mask & self.IN_Q_OVERFLOW or name.endswith(b".jsonl"):
+                    changed = True
+
+    def close(self):
+        os.close(self.fd)
+
+class TranscriptWatcher:
+    """Tells whether any Claude transcript changed since the previous check.
+
+    Uses inotify on Linux and falls back to an mtime/size sweep of the *.jsonl
+    files elsewhere (or when inotify is unavailable).
+    """
+
+    def __init__(self, data_dirs: list = None):
+        data_dirs = data_dirs if data_dirs is not None else get_claude_data_dirs()
+        self.roots = [os.path.join(d, "projects") for d in data_dirs]
+        self._inotify = None
+        if sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify(self.roots)
+            except (OSError, AttributeError):
+                self._inotify = None
+        self._signature = None if self._inotify else self._sweep()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._inotify else "stat"
+
+    def changed(self) -> bool:
+        if self._inotify:
+            return self._inotify.read_events()
+        signature = self._sweep()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        return True
+
+    def close(self):
+        if self._inotify:
+            self._inotify.close()
+
+    def _sweep(self) -> dict:
+        signature = {}
+        stack = list(self.roots)
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.name.endswith(".jsonl"):
+                            stat = entry.stat()
+                            signature[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                    except OSError:
+                        continue
+        return signature
+
 def get_subscription_period_start(start_day: int) -> date:
-    today = date.today()
-    if today.day >= start_day:
+    return get_period_start_for(date.today(), start_day)
+
+def get_period_start_for(day: date, start_day: int) -> date:
+    """Return the start of the billing period that contains `day`."""
+    if day.day >= start_day:
         # Current month, try to set the start day
-        return safe_replace_day(today, start_day)
+        return safe_replace_day(day, start_day)
     else:
         # Previous month
-        first_day_of_current_month = today.replace(day=1)
+        first_day_of_current_month = day.replace(day=1)
         last_day_of_previous_month = first_day_of_current_month - timedelta(days=1)
         return safe_replace_day(last_day_of_previous_month, start_day)
 
@@ -222,286 +1297,1899 @@ def get_next_renewal_date(start_day: int) -> date:
     target_date = date(next_year, next_month, 1)
     return safe_replace_day(target_date, start_day)
 
-def create_progress_bar(percentage: float, width: int = 40) -> str:
-    filled_width = int(width * percentage / 100)
-    bar = '█' * filled_width + ' ' * (width - filled_width)
-    return f"[{bar}]"
+# --- History Store ---
 
-def format_timedelta(td: timedelta) -> str:
-    total_seconds = int(td.total_seconds())
-    hours, remainder = divmod(total_seconds, 3600)
-    minutes, _ = divmod(remainder, 60)
-    return f"{hours}h {minutes:02d}m"
+class HistoryStore:
+    """SQLite index of completed session blocks plus the monitor's runtime state.
 
-def main(args):
-    os.system('cls' if os.name == 'nt' else 'clear')
-    config = load_config()
-    
-    # Smart single data fetch - determine optimal date range
-    sub_start_date = get_subscription_period_start(args.start_day)
-    sub_start_date_str = sub_start_date.strftime('%Y-%m-%d')
-    
-    # Determine what data we need
-    need_full_rescan = args.recalculate
-    need_max_tokens = not config.get("max_tokens") or args.recalculate
-    need_monthly_recalc = args.recalculate or config.get("monthly_meta", {}).get("period_start") != sub_start_date_str
-    
-    if need_full_rescan:
-        print(f"{Colors.WARNING}Full recalculation - fetching all data...{Colors.ENDC}")
-        fetch_since = None  # Get everything
-    elif need_monthly_recalc:
-        print(f"{Colors.WARNING}New billing period - fetching data from {sub_start_date_str}...{Colors.ENDC}")
-        fetch_since = sub_start_date.strftime('%Y%m%d')
-    else:
-        # Incremental: get data from last week to catch any new sessions
-        last_check = config.get("last_incremental_update")
-        if last_check:
-            since_date = datetime.strptime(last_check, '%Y-%m-%d') - timedelta(days=2)
-        else:
-            since_date = datetime.now() - timedelta(days=7)
-        fetch_since = since_date.strftime('%Y%m%d')
-        print(f"{Colors.CYAN}Incremental update from {since_date.strftime('%Y-%m-%d')}...{Colors.ENDC}")
-    
-    # Single ccusage call!
-    data = run_ccusage(fetch_since)
-    if not data or "blocks" not in data:
-        print(f"{Colors.FAIL}Failed to fetch usage data{Colors.ENDC}")
-        return
-    
-    blocks = data["blocks"]
-    
-    # Process max tokens
-    max_tokens_so_far = config.get("max_tokens", 35000)
-    if need_max_tokens:
-        all_tokens = [b.get("totalTokens", 0) for b in blocks if not b.get("isGap", False)]
-        if all_tokens:
-            new_max = max(all_tokens)
-            if new_max > max_tokens_so_far:
-                max_tokens_so_far = new_max
-                config["max_tokens"] = max_tokens_so_far
-                config["last_max_tokens_scan"] = datetime.now().strftime('%Y-%m-%d')
-                print(f"{Colors.GREEN}New maximum found: {max_tokens_so_far:,} tokens.{Colors.ENDC}")
-    else:
-        # Check recent data for new max
-        recent_tokens = [b.get("totalTokens", 0) for b in blocks if not b.get("isGap", False)]
-        if recent_tokens:
-            recent_max = max(recent_tokens)
-            if recent_max > max_tokens_so_far:
-                max_tokens_so_far = recent_max
-                config["max_tokens"] = max_tokens_so_far
-                print(f"{Colors.GREEN}New maximum found: {max_tokens_so_far:,} tokens.{Colors.ENDC}")
-    
-    # Process monthly data
-    monthly_meta = config.get("monthly_meta", {})
-    processed_sessions = config.get("processed_sessions", [])
-    
-    if need_monthly_recalc:
-        # Full monthly recalculation - filter blocks by billing period
-        period_start_utc = parse_utc_time(sub_start_date_str + "T00:00:00")
-        period_blocks = [b for b in blocks 
-                        if not b.get("isGap", False) and 
-                        parse_utc_time(b["startTime"]) >= period_start_utc]
-        completed_blocks = [b for b in period_blocks if not b.get("isActive", False)]
-        
-        sessions_used = len(completed_blocks)
-        cost_this_month = sum(b.get("costUSD", 0) for b in completed_blocks)
-        processed_sessions = [b["id"] for b in completed_blocks]
-        
-        monthly_meta = {"period_start": sub_start_date_str, "cost": cost_this_month, "sessions": sessions_used}
-        config["monthly_meta"] = monthly_meta
-        config["processed_sessions"] = processed_sessions
-    else:
-        # Incremental update: process only new sessions within billing period
-        period_start_utc = parse_utc_time(sub_start_date_str + "T00:00:00")
-        new_sessions_found = 0
-        for block in blocks:
-            if (block.get("isGap", False) or 
-                block["id"] in processed_sessions or
-                parse_utc_time(block["startTime"]) < period_start_utc):
-                continue
-            
-            # Only process completed sessions (not active)
-            if not block.get("isActive", False):
-                monthly_meta["sessions"] = monthly_meta.get("sessions", 0) + 1
-                monthly_meta["cost"] = monthly_meta.get("cost", 0) + block.get("costUSD", 0)
-                processed_sessions.append(block["id"])
-                new_sessions_found += 1
-        
-        if new_sessions_found > 0:
-            print(f"{Colors.GREEN}Found {new_sessions_found} new completed sessions.{Colors.ENDC}")
-            config["monthly_meta"] = monthly_meta
-            config["processed_sessions"] = processed_sessions
-    
-    config["last_incremental_update"] = datetime.now().strftime('%Y-%m-%d')
-    os.system('cls' if os.name == 'nt' else 'clear')
+    Blocks are keyed by their ccusage id, so recording a block is an upsert and the
+    monthly totals are an aggregate over the `period_start` index.
+    """
 
-    save_config(config)
-    
-    # --- Loop state variables ---
-    config_instance = Config.instance()
-    sessions_used = config.get("monthly_meta", {}).get("sessions", 0)
-    sessions_left = config_instance.TOTAL_MONTHLY_SESSIONS - sessions_used
-    cost_this_month_completed = config.get("monthly_meta", {}).get("cost", 0)
-    max_tokens_so_far = config.get("max_tokens", 35000)
-    
-    # Obliczenia dla stopki
-    next_renewal = get_next_renewal_date(args.start_day)
-    days_remaining = (next_renewal - date.today()).days
-    if days_remaining > 0:
-        avg_sessions = sessions_left / days_remaining
-    else:
-        avg_sessions = float(sessions_left) # Jeśli dziś jest ostatni dzień
+    # Runtime values that used to live in config.json next to the user settings
+    LEGACY_CONFIG_KEYS = ("max_tokens", "last_max_tokens_scan", "last_incremental_update",
+                          "monthly_meta", "processed_sessions")
 
-    cached_data = {"blocks": []}; last_fetch_time = 0
-    current_session_id = None; time_alert_fired = False; inactivity_alert_fired = False
-    last_activity_time = None; last_token_count = -1
-    
-    # Store the billing period start for consistent use in main loop
-    billing_period_fetch_since = sub_start_date.strftime('%Y%m%d')
+    def __init__(self, path: str = None):
+        import sqlite3
+        self.path = path or Config.instance().HISTORY_DB_FILE
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # The display loop takes the store over from the startup thread; it is never shared
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blocks (
+                id TEXT PRIMARY KEY,
+                start_time TEXT NOT NULL,
+                end_time TEXT NOT NULL,
+                total_tokens INTEGER NOT NULL DEFAULT 0,
+                cost_usd REAL NOT NULL DEFAULT 0,
+                period_start TEXT NOT NULL,
+                actual_end_time TEXT
+            );
+            CREATE INDEX IF NOT EXISTS blocks_period_start ON blocks (period_start);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        if "actual_end_time" not in {row[1] for row in self._conn.execute("PRAGMA table_info(blocks)")}:
+            # Databases created before `report` lack the last-activity column; old rows keep NULL
+            self._conn.execute("ALTER TABLE blocks ADD COLUMN actual_end_time TEXT")
+        # Deferred meta writes, key -> (value, keep_max), flushed together by flush()
+        self._pending = {}
+        self._flushed_at = time.time()
 
-    # --- Main loop ---
-    while True:
-        try:
-            now_utc = datetime.now(config_instance.UTC_TZ)
-            
-            if time.time() - last_fetch_time > config_instance.CCUSAGE_FETCH_INTERVAL_SECONDS:
-                # Use billing period start date to get all sessions for current period
-                fetched_data = run_ccusage(billing_period_fetch_since)
-                if fetched_data and fetched_data.get("blocks"):
-                    cached_data = fetched_data
-                last_fetch_time = time.time()
-
-            active_block = None
-            if "blocks" in cached_data:
-                for block in cached_data["blocks"]:
-                    if block.get("isGap", False): continue
-                    start_time = parse_utc_time(block["startTime"])
-                    end_time = parse_utc_time(block["endTime"])
-                    if start_time <= now_utc <= end_time:
-                        active_block = block
-                        break
-            
-            if not active_block and current_session_id:
-                # Session just ended - update monthly stats from cached data
-                if "blocks" in cached_data:
-                    # Filter blocks for current billing period
-                    period_start = parse_utc_time(sub_start_date_str + "T00:00:00")
-                    period_blocks = [b for b in cached_data["blocks"] 
-                                   if not b.get("isGap", False) and 
-                                   parse_utc_time(b["startTime"]) >= period_start]
-                    completed_blocks = [b for b in period_blocks if not b.get("isActive", False)]
-                    
-                    new_sessions_used = len(completed_blocks)
-                    new_cost_this_month_completed = sum(b.get("costUSD", 0) for b in completed_blocks)
-                    
-                    # Update processed sessions list to maintain consistency
-                    processed_sessions = [b["id"] for b in completed_blocks]
-                    
-                    # Update config and recalculate derived values
-                    config["monthly_meta"]["sessions"] = new_sessions_used
-                    config["monthly_meta"]["cost"] = new_cost_this_month_completed
-                    config["processed_sessions"] = processed_sessions
-                    save_config(config)
-                    
-                    # Update main display variables immediately for next iteration
-                    sessions_used = new_sessions_used
-                    cost_this_month_completed = new_cost_this_month_completed
-                    sessions_left = config_instance.TOTAL_MONTHLY_SESSIONS - sessions_used
-                    if days_remaining > 0:
-                        avg_sessions = sessions_left / days_remaining
-                    else:
-                        avg_sessions = float(sessions_left)
-                
-                current_session_id = None; time_alert_fired = False; inactivity_alert_fired = False
-                last_activity_time = None; last_token_count = -1
-
-            clear_screen_for_refresh()
-            now_local = datetime.now(config_instance.LOCAL_TZ)
-            print(f"{Colors.HEADER}{Colors.BOLD}✦ ✧ ✦ CLAUDE SESSION MONITOR ✦ ✧ ✦{Colors.ENDC}")
-            print(f"{Colors.HEADER}{'=' * 35}{Colors.ENDC}\n")
-
-            if active_block:
-                if active_block['id'] != current_session_id:
-                    current_session_id = active_block['id']; time_alert_fired = False
-                    inactivity_alert_fired = False; last_activity_time = now_utc
-                    last_token_count = active_block.get("totalTokens", 0)
-
-                tokens_current = active_block.get("totalTokens", 0)
-                if tokens_current > max_tokens_so_far:
-                    max_tokens_so_far = tokens_current
-                    config["max_tokens"] = max_tokens_so_far
-                    save_config(config)
-
-                token_limit = max_tokens_so_far
-                token_usage_percent = (tokens_current / token_limit) * 100 if token_limit > 0 else 0
-                
-                end_time = parse_utc_time(active_block["endTime"])
-                time_remaining = end_time - now_utc
-                time_total = end_time - parse_utc_time(active_block["startTime"])
-                time_progress_percent = (1 - (time_remaining.total_seconds() / time_total.total_seconds())) * 100
-
-                if not time_alert_fired and time_remaining < timedelta(minutes=config_instance.TIME_REMAINING_ALERT_MINUTES):
-                    show_notification("Claude Monitor", f"Less than {config_instance.TIME_REMAINING_ALERT_MINUTES} minutes remaining in the session.")
-                    time_alert_fired = True
-
-                if tokens_current > last_token_count:
-                    last_activity_time = now_utc; last_token_count = tokens_current; inactivity_alert_fired = False
-                else:
-                    inactive_duration = now_utc - last_activity_time
-                    if not inactivity_alert_fired and inactive_duration > timedelta(minutes=config_instance.INACTIVITY_ALERT_MINUTES):
-                        show_notification("Claude Monitor", f"No activity for {config_instance.INACTIVITY_ALERT_MINUTES} minutes.")
-                        inactivity_alert_fired = True
-                
-                cost_current_session = active_block.get("costUSD", 0)
-                total_cost_display = cost_this_month_completed - active_block.get("costUSD", 0) + cost_current_session
-
-                print(f"Token Usage:   {Colors.GREEN}{create_progress_bar(token_usage_percent)}{Colors.ENDC} {token_usage_percent:.1f}%")
-                print(f"Time to Reset: {Colors.BLUE}{create_progress_bar(time_progress_percent)}{Colors.ENDC} {format_timedelta(time_remaining)}")
-                print(f"\n{Colors.BOLD}Tokens:{Colors.ENDC}        {tokens_current:,} / ~{token_limit:,}\n{Colors.BOLD}Session Cost:{Colors.ENDC}  ${cost_current_session:.2f}\n")
-            else:
-                total_cost_display = cost_this_month_completed
-                print(f"\n{Colors.WARNING}Waiting for a new session to start...{Colors.ENDC}\n\nSaved max tokens: {int(max_tokens_so_far):,}\nCurrent subscription period started: {sub_start_date_str}\n")
+    def close(self):
+        self.flush()
+        self._conn.close()
 
-            # --- Footer ---
-            print("=" * 60)
-            footer_line1 = f"⏰ {now_local.strftime('%H:%M:%S')}   🗓️ Sessions: {Colors.BOLD}{sessions_used} used, {sessions_left} left{Colors.ENDC} | 💰 Cost (mo): ${total_cost_display:.2f}"
-            footer_line2 = f"  └─ ⏳ {days_remaining} days left (avg. {avg_sessions:.1f} sessions/day) | Ctrl+C to exit"
-            print(footer_line1)
-            print(footer_line2)
+    def get(self, key: str, default=None):
+        if key in self._pending:
+            return self._pending[key][0]
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
 
-            time.sleep(config_instance.REFRESH_INTERVAL_SECONDS)
+    def set(self, key: str, value, defer: bool = False):
+        """Store a meta value; with `defer` it is only written by the next flush()."""
+        if defer:
+            self._pending[key] = (value, False)
+            return
+        self._pending.pop(key, None)
+        self._write_meta([(key, value, False)])
 
-        except KeyboardInterrupt:
-            print("\033[?25h", end="")  # Show cursor
-            print(f"\n\n{Colors.WARNING}Closing monitor...{Colors.ENDC}")
-            sys.exit(0)
+    def raise_to(self, key: str, value):
+        """Deferred set that never lowers the stored number, even if another process raised it."""
+        self._pending[key] = (value, True)
 
-if __name__ == "__main__":
-    # Load saved user settings
-    saved_config = load_config()
-    user_settings = saved_config.get("user_settings", {})
-    
-    parser = argparse.ArgumentParser(description="Monitor Claude API token and cost usage.", formatter_class=argparse.RawTextHelpFormatter)
-    parser.add_argument("--start-day", type=int, default=user_settings.get("start_day", 1), 
-                       help=f"Day of the month the billing period starts. Default: {user_settings.get('start_day', 1)}")
-    parser.add_argument("--recalculate", action="store_true", help="Forces re-scanning of history to update \nstored values (max tokens and costs).")
-    parser.add_argument("--test-alert", action="store_true", help="Sends a test system notification and exits.")
-    parser.add_argument("--timezone", type=str, default=user_settings.get("timezone", "Europe/Warsaw"), 
+    def flush(self, force: bool = True):
+        """Write deferred meta values; unless forced, at most every STATE_FLUSH_INTERVAL_SECONDS."""
+        if not self._pending:
+            return
+        if not force and time.time() - self._flushed_at < Config.instance().STATE_FLUSH_INTERVAL_SECONDS:
+            return
+        pending, self._pending = self._pending, {}
+        self._write_meta([(key, value, keep_max) for key, (value, keep_max) in pending.items()])
+        self._flushed_at = time.time()
+
+    def _write_meta(self, items: list):
+        with Metrics.instance().phase("store_write"), self._conn:
+            for key, value, keep_max in items:
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES (?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value"
+                    + (" WHERE CAST(excluded.value AS REAL) > CAST(meta.value AS REAL)" if keep_max else ""),
+                    (key, json.dumps(value)))
+
+    def migrate_legacy_config(self, config: dict) -> bool:
+        """Move runtime values out of an old config.json. Returns True if config was changed."""
+        if not any(key in config for key in self.LEGACY_CONFIG_KEYS):
+            return False
+        for key in ("max_tokens", "last_max_tokens_scan", "last_incremental_update"):
+            if key in config and self.get(key) is None:
+                self.set(key, config[key])
+        # processed_sessions only holds ids, so the current period is rebuilt on the next start
+        for key in self.LEGACY_CONFIG_KEYS:
+            config.pop(key, None)
+        return True
+
+    def upsert_blocks(self, blocks, start_day: int) -> int:
+        """Record the completed blocks among `blocks`. Returns how many of them were new."""
+        utc = Config.instance().UTC_TZ
+        rows = [(b.id, format_utc_iso(b.start), format_utc_iso(b.end), b.total_tokens, b.cost_usd,
+                 get_period_start_for(datetime.fromtimestamp(b.start, utc).date(), start_day).isoformat(),
+                 format_utc_iso(b.last_activity) if b.last_activity else None)
+                for b in blocks if not b.is_active]
+        if not rows:
+            return 0
+        with Metrics.instance().phase("store_write"), self._conn:
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO blocks (id, start_time, end_time, total_tokens, cost_usd, period_start, "
+                "actual_end_time) VALUES (?, ?, ?, ?, ?, ?, ?)", rows).rowcount
+            self._conn.executemany(
+                "UPDATE blocks SET start_time = ?, end_time = ?, total_tokens = ?, cost_usd = ?, period_start = ?, "
+                "actual_end_time = ? WHERE id = ?", [row[1:] + row[:1] for row in rows])
+        return inserted
+
+    def block_rows(self, since: str = None, until: str = None):
+        """Yield (start_time, actual_end_time, total_tokens, cost_usd) of the stored blocks, oldest first.
+
+        `since` is inclusive and `until` exclusive (block start times, UTC ISO).
+        """
+        query = "SELECT start_time, actual_end_time, total_tokens, cost_usd FROM blocks WHERE 1"
+        params = []
+        if since:
+            query += " AND start_time >= ?"
+            params.append(since)
+        if until:
+            query += " AND start_time < ?"
+            params.append(until)
+        return self._conn.execute(query + " ORDER BY start_time", params)
+
+    def coverage(self) -> list:
+        """Sorted, disjoint [start, end] spans (UTC ISO; "" is the beginning of the history) in
+        which every block that completed is stored."""
+        return self.get("coverage", [])
+
+    def add_coverage(self, start: str, end: str, defer: bool = False):
+        spans = sorted([list(span) for span in self.coverage()] + [[start, end]])
+        merged = []
+        for span_start, span_end in spans:
+            if merged and span_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], span_end)
+            else:
+                merged.append([span_start, span_end])
+        self.set("coverage", merged, defer=defer)
+
+    def clear_period(self, period_start: str):
+        with Metrics.instance().phase("store_write"), self._conn:
+            self._conn.execute("DELETE FROM blocks WHERE period_start = ?", (period_start,))
+
+    def period_block_ids(self, period_start: str) -> set:
+        return {row[0] for row in self._conn.execute("SELECT id FROM blocks WHERE period_start = ?", (period_start,))}
+
+    def period_totals(self, period_start: str):
+        """Return (sessions, cost) of the completed blocks in a billing period."""
+        sessions, cost = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(cost_usd), 0) FROM blocks WHERE period_start = ?",
+            (period_start,)).fetchone()
+        return sessions, cost
+
+# --- Token Ceiling Estimation ---
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch-style log buckets).
+
+    A value v is counted in bucket ceil(log_gamma(v)) with gamma = (1 + a) / (1 - a), so
+    every quantile is within a relative error `a`. Above `max_bins` buckets the lowest
+    ones are folded together, which only blurs the low quantiles; memory stays constant.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 512):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float, count: int = 1):
+        if value <= 0:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+
+    def merge(self, other: "QuantileSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge sketches with different accuracies")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins
+        self.bins[keys[excess]] += sum(self.bins.pop(key) for key in keys[:excess])
+
+    def quantile(self, q: float):
+        """Value at quantile `q` (0..1), or None while the sketch is empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                break
+        # Bucket midpoint in the relative sense: at most `a` away from every value in it
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def to_dict(self) -> dict:
+        return {"accuracy": self.relative_accuracy, "max_bins": self.max_bins, "zero": self.zero_count,
+                "bins": {str(key): count for key, count in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        sketch = cls(data["accuracy"], data["max_bins"])
+        sketch.bins = {int(key): count for key, count in data["bins"].items()}
+        sketch.zero_count = data["zero"]
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
+
+class DecayedMax:
+    """Maximum whose value halves every `half_life` seconds, so old peaks fade out."""
+
+    def __init__(self, half_life: float, value: float = 0.0, updated_at: float = None):
+        self.half_life = half_life
+        self.value = value
+        self.updated_at = updated_at
+
+    def add(self, value: float, at: float):
+        if self.updated_at is None or at >= self.updated_at:
+            self.value = max(self.value_at(at), value)
+            self.updated_at = at
+        else:
+            # An older observation counts with the decay it has had since
+            self.value = max(self.value, value * 0.5 ** ((self.updated_at - at) / self.half_life))
+
+    def value_at(self, now: float) -> float:
+        if self.updated_at is None:
+            return 0.0
+        return self.value * 0.5 ** (max(0.0, now - self.updated_at) / self.half_life)
+
+class TokenCeiling:
+    """Streaming estimates of a session's token ceiling from completed blocks.
+
+    Keeps a QuantileSketch and a DecayedMax of completed-block totals, folded in once
+    each as blocks complete (tracked by the start of the latest block folded in), so
+    no history rescan is ever needed. The state persists as a few KB of JSON.
+    """
+
+    MODES = ("max", "p95", "p99", "decayed-max")
+
+    def __init__(self, state: dict = None):
+        config = Config.instance()
+        state = state or {}
+        self.sketch = (QuantileSketch.from_dict(state["sketch"]) if "sketch" in state else
+                       QuantileSketch(config.CEILING_SKETCH_ACCURACY, config.CEILING_SKETCH_MAX_BINS))
+        decayed = state.get("decayed", {})
+        self.decayed = DecayedMax(config.CEILING_HALF_LIFE_DAYS * 86400, decayed.get("value", 0.0),
+                                  decayed.get("updated_at"))
+        self.watermark = state.get("watermark", float("-inf"))
+        self._quantiles = {}
+
+    def observe(self, tokens: int, start: float, end: float) -> bool:
+        """Fold in a completed block; blocks at or before the watermark were already counted."""
+        if start <= self.watermark:
+            return False
+        self.sketch.add(tokens)
+        self.decayed.add(tokens, end)
+        self.watermark = start
+        self._quantiles.clear()
+        return True
+
+    def value(self, mode: str, max_tokens: int, now: float) -> int:
+        """The ceiling for `mode`; the all-time maximum until any block has been observed."""
+        if mode == "max" or not self.sketch.count:
+            return max_tokens
+        if mode == "decayed-max":
+            estimate = self.decayed.value_at(now)
+        else:
+            if mode not in self._quantiles:
+                self._quantiles[mode] = self.sketch.quantile(int(mode[1:]) / 100)
+            estimate = self._quantiles[mode]
+        return int(estimate) or max_tokens
+
+    def to_dict(self) -> dict:
+        return {"sketch": self.sketch.to_dict(), "watermark": self.watermark,
+                "decayed": {"value": self.decayed.value, "updated_at": self.decayed.updated_at}}
+
+# --- Period Aggregation ---
+
+class PeriodAggregator:
+    """Running totals (sessions used, completed cost, max tokens) for the current billing period.
+
+    Totals are updated by delta as blocks appear or complete and persisted through the
+    HistoryStore; a billing-period rollover resets them without re-fetching history.
+    """
+
+    def __init__(self, store: HistoryStore, start_day: int):
+        self.store = store
+        self.start_day = start_day
+        self.max_tokens = store.get("max_tokens", 35000)
+        state = store.get("token_ceiling")
+        self.ceiling = TokenCeiling(state)
+        if state is None:
+            # First run with the estimator: seed it once from the blocks already in the store
+            for start, _, tokens, _ in store.block_rows():
+                start = parse_utc_epoch(start)
+                self.ceiling.observe(tokens, start, start + SESSION_DURATION_SECONDS)
+            self._save_ceiling()
+        self._load_period(get_subscription_period_start(start_day))
+
+    def _save_ceiling(self):
+        self.store.set("token_ceiling", self.ceiling.to_dict(), defer=True)
+
+    def token_limit(self, mode: str, now: float) -> int:
+        """Token ceiling shown on the usage bar: see TokenCeiling.MODES."""
+        return self.ceiling.value(mode, self.max_tokens, now)
+
+    def _load_period(self, period_start: date):
+        self.period_start = period_start
+        self.period_start_str = period_start.strftime('%Y-%m-%d')
+        self.period_start_epoch = datetime.combine(period_start, datetime.min.time(),
+                                                   tzinfo=Config.instance().UTC_TZ).timestamp()
+        # Blocks that already belong to the new period may have been stored before the rollover
+        self.sessions, self.cost = self.store.period_totals(self.period_start_str)
+        self._counted = self.store.period_block_ids(self.period_start_str)
+
+    def mark_covered(self, until: float, defer: bool = True):
+        """Record that the store holds every block of the period that completed before `until`."""
+        # ccusage reads -s dates in local time, which may start after the UTC period start
+        local_start = datetime.combine(self.period_start, datetime.min.time()).timestamp()
+        self.store.add_coverage(format_utc_iso(max(self.period_start_epoch, local_start)), format_utc_iso(until),
+                                defer=defer)
+
+    def check_rollover(self) -> bool:
+        """Switch to a new billing period if one has started. Returns True on rollover."""
+        period_start = get_subscription_period_start(self.start_day)
+        if period_start == self.period_start:
+            return False
+        self._load_period(period_start)
+        self.store.set("period_start", self.period_start_str)
+        return True
+
+    def rebuild(self, blocks) -> int:
+        """Replace the stored period with `blocks`; used after a full-period or full-history fetch.
+
+        `blocks` may be any iterable of Blocks in start order, including a stream: max tokens
+        and the period's sessions and cost are folded in a single pass while the blocks are
+        written in batches. Returns the number of blocks seen.
+        """
+        batch_size = Config.instance().STREAM_BATCH_BLOCKS
+        self.store.clear_period(self.period_start_str)
+        max_tokens, sessions, cost, counted, seen = 0, 0, 0.0, set(), 0
+        batch = []
+        for block in blocks:
+            seen += 1
+            max_tokens = max(max_tokens, block.total_tokens)
+            if not block.is_active:
+                self.ceiling.observe(block.total_tokens, block.start, block.end)
+            if block.start >= self.period_start_epoch and not block.is_active:
+                sessions += 1
+                cost += block.cost_usd
+                counted.add(block.id)
+            batch.append(block)
+            if len(batch) >= batch_size:
+                self.store.upsert_blocks(batch, self.start_day)
+                batch = []
+        self.store.upsert_blocks(batch, self.start_day)
+        self.store.set("period_start", self.period_start_str)
+        self.sessions, self.cost, self._counted = sessions, cost, counted
+        self.observe_tokens(max_tokens)
+        self._save_ceiling()
+        return seen
+
+    def observe(self, blocks: BlockIndex) -> int:
+        """Fold newly completed blocks into the totals. Returns the number of sessions added.
+
+        Callers run check_rollover() first, so that they see (and act on) a new period.
+        """
+        self.observe_tokens(blocks.max_tokens())
+        completed = [b for b in blocks.since(self.period_start_epoch)
+                     if not b.is_active and b.id not in self._counted]
+        if not completed:
+            return 0
+        self.store.upsert_blocks(completed, self.start_day)
+        for block in completed:
+            self._counted.add(block.id)
+            self.sessions += 1
+            self.cost += block.cost_usd
+            self.ceiling.observe(block.total_tokens, block.start, block.end)
+        self._save_ceiling()
+        return len(completed)
+
+    def observe_tokens(self, tokens: int) -> bool:
+        """Raise the saved maximum if `tokens` exceeds it. Returns True if it changed."""
+        if tokens <= self.max_tokens:
+            return False
+        self.max_tokens = tokens
+        # Rises come in bursts during heavy sessions; the store batches them
+        self.store.raise_to("max_tokens", tokens)
+        return True
+
+    def recompute(self, blocks: BlockIndex):
+        """Full recomputation of (sessions, cost) for the current period from `blocks`."""
+        completed = [b for b in blocks.since(self.period_start_epoch) if not b.is_active]
+        return len(completed), sum(b.cost_usd for b in completed)
+
+    def is_consistent(self, blocks: BlockIndex) -> bool:
+        """Check the running totals against a full recompute over the same blocks."""
+        sessions, cost = self.recompute(blocks)
+        return sessions == self.sessions and abs(cost - self.cost) < 1e-6
+
+def create_progress_bar(percentage: float, width: int = 40) -> str:
+    # A percentile ceiling can be exceeded; the bar just stays full
+    filled_width = int(width * min(max(percentage, 0), 100) / 100)
+    bar = '█' * filled_width + ' ' * (width - filled_width)
+    return f"[{bar}]"
+
+def format_timedelta(td: timedelta) -> str:
+    total_seconds = int(td.total_seconds())
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes, _ = divmod(remainder, 60)
+    return f"{hours}h {minutes:02d}m"
+
+def format_data_age(age, coarse: bool = False) -> str:
+    if age is None:
+        return f"{Colors.WARNING}waiting for data{Colors.ENDC}"
+    age = int(age)
+    # Coarse mode matches the minute clock shown while idle
+    text = (f"{age // 60}m old" if age >= 60 else "<1m old") if coarse else f"{age}s old"
+    if age > Config.instance().CCUSAGE_FETCH_INTERVAL_SECONDS * 3:
+        return f"{Colors.WARNING}{text}{Colors.ENDC}"
+    return text
+
+# --- Burn Rate Forecast ---
+
+class BurnRateForecaster:
+    """Token and cost burn rates of the active block over a sliding window.
+
+    Samples go into a fixed-size ring buffer, spaced at least BURN_RATE_SAMPLE_SECONDS
+    apart (a newer reading replaces the latest sample until the spacing is reached). The
+    rates are the slope between the oldest sample inside the window and the newest,
+    so adding a sample and reading a rate are O(1) however long the session runs.
+    """
+
+    def __init__(self, size: int = None, window_seconds: float = None, spacing_seconds: float = None):
+        config = Config.instance()
+        self.size = size or config.BURN_RATE_SAMPLES
+        self.window_seconds = window_seconds or config.BURN_RATE_WINDOW_MINUTES * 60
+        self.spacing_seconds = spacing_seconds if spacing_seconds is not None else config.BURN_RATE_SAMPLE_SECONDS
+        self._times = [0.0] * self.size
+        self._tokens = [0] * self.size
+        self._costs = [0.0] * self.size
+        self.reset()
+
+    def reset(self, block_id: str = None):
+        self.block_id = block_id
+        self._oldest = 0
+        self._count = 0
+
+    def add(self, timestamp: float, tokens: int, cost: float):
+        newest = (self._oldest + self._count - 1) % self.size
+        previous = (newest - 1) % self.size
+        if self._count >= 2 and self._times[newest] - self._times[previous] < self.spacing_seconds:
+            # The newest sample tracks the latest reading until it is spaced from the one before
+            slot = newest
+        elif self._count < self.size:
+            slot = (self._oldest + self._count) % self.size
+            self._count += 1
+        else:
+            # Full: overwrite the oldest sample
+            slot = self._oldest
+            self._oldest = (self._oldest + 1) % self.size
+        self._times[slot] = timestamp
+        self._tokens[slot] = tokens
+        self._costs[slot] = cost
+        # Drop samples that slid out of the window, keeping at least two for a slope
+        while self._count > 2 and self._times[(self._oldest + 1) % self.size] <= timestamp - self.window_seconds:
+            self._oldest = (self._oldest + 1) % self.size
+            self._count -= 1
+
+    def _slope(self, values: list):
+        if self._count < 2:
+            return None
+        newest = (self._oldest + self._count - 1) % self.size
+        elapsed = self._times[newest] - self._times[self._oldest]
+        if elapsed <= 0:
+            return None
+        return (values[newest] - values[self._oldest]) / elapsed
+
+    def tokens_per_minute(self):
+        slope = self._slope(self._tokens)
+        return slope * 60 if slope is not None else None
+
+    def cost_per_hour(self):
+        slope = self._slope(self._costs)
+        return slope * 3600 if slope is not None else None
+
+    def limit_eta(self, tokens: int, limit: int, now: float):
+        """Epoch time at which `limit` is reached at the current pace, or None if it is not approached."""
+        slope = self._slope(self._tokens)
+        if not slope or slope <= 0 or tokens >= limit:
+            return None
+        return now + (limit - tokens) / slope
+
+def forecast_sessions(sessions_used: int, total_sessions: int, period_start: date, renewal: date, today: date) -> dict:
+    """Project session use at the period's average pace so far: does what is left last until renewal?"""
+    days_elapsed = max(1, (today - period_start).days + 1)
+    pace = sessions_used / days_elapsed
+    sessions_left = total_sessions - sessions_used
+    runs_out = None
+    if pace > 0 and sessions_left / pace < (renewal - today).days:
+        runs_out = (today + timedelta(days=max(0, int(sessions_left / pace)))).isoformat()
+    return {"pace_per_day": pace, "projected_total": sessions_used + pace * (renewal - today).days,
+            "runs_out": runs_out}
+
+# --- Monitor ---
+
+class Monitor:
+    """Owns fetching, aggregation and alerts, and turns them into one status dict per tick.
+
+    The status is plain JSON data, so the same value drives the local display,
+    the daemon socket and attached viewers.
+    """
+
+    def __init__(self, args, store: HistoryStore, aggregator: PeriodAggregator, fetcher: UsageFetcher,
+                 notifier: NotificationDispatcher = None, total_sessions: int = None, status_file: str = None):
+        self.args = args
+        self.total_sessions = total_sessions or Config.instance().TOTAL_MONTHLY_SESSIONS
+        self.status_file = status_file or Config.instance().STATUS_FILE
+        self.ceiling_mode = getattr(args, "ceiling", "max")
+        self.store = store
+        self.aggregator = aggregator
+        self.fetcher = fetcher
+        self.notifier = notifier
+        self.last_persisted = 0; self.last_persisted_key = None; self.last_metrics_export = 0
+        self.cached_blocks = BlockIndex(); self.last_snapshot = None
+        self.current_session_id = None; self.time_alert_fired = False; self.inactivity_alert_fired = False
+        self.last_activity_time = None; self.last_token_count = -1
+        self.forecaster = BurnRateForecaster(); self.burn_alert_fired = False
+
+    def close(self):
+        self.fetcher.stop()
+        if self.notifier:
+            self.notifier.close(timeout=Config.instance().NOTIFICATION_TIMEOUT_SECONDS)
+        self.store.close()
+
+    def tick(self) -> dict:
+        config_instance = Config.instance()
+        aggregator = self.aggregator
+        now_utc = datetime.now(config_instance.UTC_TZ)
+
+        if aggregator.check_rollover():
+            self.fetcher.since_date = aggregator.period_start.strftime('%Y%m%d')
+        snapshot = self.fetcher.latest()
+        if snapshot is not None and snapshot is not self.last_snapshot:
+            self.cached_blocks = snapshot.blocks; self.last_snapshot = snapshot
+            with Metrics.instance().phase("aggregate"):
+                aggregator.observe(self.cached_blocks)
+                # The fetcher always covers the whole period, so the store is now complete up to the fetch
+                aggregator.mark_covered(snapshot.fetched_at)
+
+        # Obliczenia dla stopki
+        sessions_used = aggregator.sessions
+        sessions_left = self.total_sessions - sessions_used
+        renewal_date = get_next_renewal_date(self.args.start_day)
+        days_remaining = (renewal_date - date.today()).days
+        if days_remaining > 0:
+            avg_sessions = sessions_left / days_remaining
+        else:
+            avg_sessions = float(sessions_left) # Jeśli dziś jest ostatni dzień
+
+        now_ts = now_utc.timestamp()
+        active_block = self.cached_blocks.find_active(now_ts)
+
+        if not active_block and self.current_session_id:
+            # Session just ended - fresh data marks it completed and the aggregator counts it
+            self.fetcher.refresh()
+            self.current_session_id = None; self.time_alert_fired = False; self.inactivity_alert_fired = False
+            self.last_activity_time = None; self.last_token_count = -1
+
+        status = {
+            "version": config_instance.VERSION,
+            "generated_at": now_ts,
+            "data_age": self.fetcher.data_age(now_ts),
+            "period_start": aggregator.period_start_str,
+            "sessions_used": sessions_used,
+            "sessions_left": sessions_left,
+            "days_remaining": days_remaining,
+            "avg_sessions_per_day": avg_sessions,
+            "sessions_forecast": forecast_sessions(sessions_used, self.total_sessions,
+                                                   aggregator.period_start, renewal_date, date.today()),
+            "max_tokens": aggregator.max_tokens,
+            "token_ceiling": {"mode": self.ceiling_mode, "value": aggregator.token_limit(self.ceiling_mode, now_ts)},
+            "monthly_cost": aggregator.cost,
+            "active_block": None,
+        }
+        if active_block:
+            status["active_block"] = self._track_active_block(active_block, now_utc)
+        self._persist(status)
+        self.store.flush(force=False)
+        self._export_metrics(now_ts)
+        return status
+
+    def _export_metrics(self, now: float):
+        path = getattr(self.args, "metrics_file", None)
+        if not path or now - self.last_metrics_export < Config.instance().METRICS_EXPORT_INTERVAL_SECONDS:
+            return
+        self.last_metrics_export = now
+        try:
+            Metrics.instance().export(path)
+        except OSError:
+            pass
+
+    def _persist(self, status: dict):
+        """Save the status for `--once` readers: on visible changes, else every few seconds."""
+        active = status["active_block"]
+        key = (status["sessions_used"], status["max_tokens"], active and (active["id"], active["tokens"]))
+        if key == self.last_persisted_key and \
+                status["generated_at"] - self.last_persisted < Config.instance().STATUS_WRITE_INTERVAL_SECONDS:
+            return
+        try:
+            with Metrics.instance().phase("persist"):
+                write_json_atomic(self.status_file, status)
+        except OSError:
+            return
+        self.last_persisted = status["generated_at"]; self.last_persisted_key = key
+
+    def _track_active_block(self, active_block: Block, now_utc: datetime) -> dict:
+        config_instance = Config.instance()
+        if active_block.id != self.current_session_id:
+            self.current_session_id = active_block.id; self.time_alert_fired = False
+            self.inactivity_alert_fired = False; self.last_activity_time = now_utc
+            self.last_token_count = active_block.total_tokens
+            self.forecaster.reset(active_block.id); self.burn_alert_fired = False
+
+        tokens_current = active_block.total_tokens
+        self.aggregator.observe_tokens(tokens_current)
+
+        now_ts = now_utc.timestamp()
+        token_limit = self.aggregator.token_limit(self.ceiling_mode, now_ts)
+        token_usage_percent = (tokens_current / token_limit) * 100 if token_limit > 0 else 0
+
+        self.forecaster.add(now_ts, tokens_current, active_block.cost_usd)
+        limit_eta = self.forecaster.limit_eta(tokens_current, token_limit, now_ts)
+        time_remaining = timedelta(seconds=active_block.end - now_ts)
+        time_total = timedelta(seconds=active_block.end - active_block.start)
+        time_progress_percent = (1 - (time_remaining.total_seconds() / time_total.total_seconds())) * 100
+
+        if self.notifier and not self.time_alert_fired and time_remaining < timedelta(minutes=config_instance.TIME_REMAINING_ALERT_MINUTES):
+            self.notifier.notify(f"Less than {config_instance.TIME_REMAINING_ALERT_MINUTES} minutes remaining in the session.")
+            self.time_alert_fired = True
+
+        if self.notifier and not self.burn_alert_fired and limit_eta and limit_eta < active_block.end and \
+                limit_eta - now_ts < config_instance.BURN_RATE_ALERT_MINUTES * 60:
+            minutes = max(1, int((limit_eta - now_ts) / 60))
+            self.notifier.notify(f"At the current pace the token limit will be reached in ~{minutes} minutes, before the session resets.")
+            self.burn_alert_fired = True
+
+        if tokens_current > self.last_token_count:
+            self.last_activity_time = now_utc; self.last_token_count = tokens_current; self.inactivity_alert_fired = False
+        else:
+            inactive_duration = now_utc - self.last_activity_time
+            if self.notifier and not self.inactivity_alert_fired and inactive_duration > timedelta(minutes=config_instance.INACTIVITY_ALERT_MINUTES):
+                self.notifier.notify(f"No activity for {config_instance.INACTIVITY_ALERT_MINUTES} minutes.")
+                self.inactivity_alert_fired = True
+
+        return {
+            "id": active_block.id,
+            "start": active_block.start,
+            "end": active_block.end,
+            "tokens": tokens_current,
+            "token_limit": token_limit,
+            "token_percent": token_usage_percent,
+            "time_percent": time_progress_percent,
+            "time_remaining": time_remaining.total_seconds(),
+            "cost": active_block.cost_usd,
+            "tokens_per_minute": self.forecaster.tokens_per_minute(),
+            "cost_per_hour": self.forecaster.cost_per_hour(),
+            "limit_eta": limit_eta,
+        }
+
+def format_profile_line(snapshot: dict = None) -> str:
+    """Footer overlay with the latest duration of each monitor phase (--profile).
+
+    `snapshot` is a Metrics.snapshot() taken elsewhere (the daemon's, for --attach); default: this process's.
+    """
+    if snapshot is None:
+        snapshot = Metrics.instance().snapshot()
+    parts = []
+    for name in Metrics.PHASES:
+        phase = snapshot.get("phases", {}).get(name)
+        parts.append(f"{name} {phase['last'] * 1000:.1f}ms" if phase else f"{name} -")
+    gauges = snapshot.get("gauges", {})
+    payload = f"{gauges.get('payload_bytes', 0) / 1024:.0f}KB, {gauges.get('blocks', 0)} blocks"
+    if "first_frame_seconds" in gauges:
+        payload += f", first frame {gauges['first_frame_seconds'] * 1000:.0f}ms"
+    return f"{Colors.CYAN}  ⏱ {' | '.join(parts)} ({payload}){Colors.ENDC}"
+
+def format_burn_rate(active: dict, tz) -> str:
+    rate = active.get("tokens_per_minute")
+    if rate is None:
+        return "measuring..."
+    text = f"{rate:,.0f} tok/min | ${active['cost_per_hour'] or 0:.2f}/h"
+    eta = active.get("limit_eta")
+    if eta is None:
+        return text
+    if eta < active["end"]:
+        return f"{text} | {Colors.WARNING}limit at ~{datetime.fromtimestamp(eta, tz).strftime('%H:%M')}, before reset{Colors.ENDC}"
+    return f"{text} | limit not reached before reset"
+
+def render_frame(status: dict, profile: bool = False, placeholder: str = None, metrics: dict = None) -> list:
+    """Build the display lines for a status dict (or `placeholder` when it is None).
+
+    A status with a "stale" message is a cached one, shown under a banner until live data arrives.
+    `metrics` is the snapshot the --profile line shows, when it is not this process's.
+    """
+    config_instance = Config.instance()
+    frame = [f"{Colors.HEADER}{Colors.BOLD}✦ ✧ ✦ CLAUDE SESSION MONITOR ✦ ✧ ✦{Colors.ENDC}",
+             f"{Colors.HEADER}{'=' * 35}{Colors.ENDC}\n"]
+    if status is None:
+        frame.append(f"\n{placeholder or f'{Colors.FAIL}Monitor daemon is not reachable - retrying...{Colors.ENDC}'}\n")
+        frame.append("=" * 60)
+        frame.append(f"⏰ {datetime.now(config_instance.LOCAL_TZ).strftime('%H:%M:%S')} | Ctrl+C to exit")
+        return "\n".join(frame).split("\n")
+
+    now_local = datetime.fromtimestamp(status["generated_at"], config_instance.LOCAL_TZ)
+    if status.get("stale"):
+        frame.append(f"{Colors.WARNING}⟳ Last saved status, updating:{Colors.ENDC} {status['stale']}")
+    active = status["active_block"]
+    if active:
+        cost_current_session = active["cost"]
+        total_cost_display = status["monthly_cost"] - active["cost"] + cost_current_session
+
+        frame.append(f"Token Usage:   {Colors.GREEN}{create_progress_bar(active['token_percent'])}{Colors.ENDC} {active['token_percent']:.1f}%")
+        frame.append(f"Time to Reset: {Colors.BLUE}{create_progress_bar(active['time_percent'])}{Colors.ENDC} {format_timedelta(timedelta(seconds=active['time_remaining']))}")
+        frame.append(f"\n{Colors.BOLD}Tokens:{Colors.ENDC}        {active['tokens']:,} / ~{active['token_limit']:,}\n{Colors.BOLD}Session Cost:{Colors.ENDC}  ${cost_current_session:.2f}")
+        frame.append(f"{Colors.BOLD}Burn Rate:{Colors.ENDC}     {format_burn_rate(active, config_instance.LOCAL_TZ)}\n")
+    else:
+        total_cost_display = status["monthly_cost"]
+        ceiling = status.get("token_ceiling") or {"mode": "max"}
+        ceiling_line = f"\nToken ceiling ({ceiling['mode']}): {int(ceiling['value']):,}" if ceiling["mode"] != "max" else ""
+        frame.append(f"\n{Colors.WARNING}Waiting for a new session to start...{Colors.ENDC}\n\nSaved max tokens: {int(status['max_tokens']):,}{ceiling_line}\nCurrent subscription period started: {status['period_start']}\n")
+
+    # --- Footer ---
+    # While idle nothing moves but the clock, so it drops to minute granularity
+    idle = active is None
+    frame.append("=" * 60)
+    footer_line1 = f"⏰ {now_local.strftime('%H:%M' if idle else '%H:%M:%S')}   🗓️ Sessions: {Colors.BOLD}{status['sessions_used']} used, {status['sessions_left']} left{Colors.ENDC} | 💰 Cost (mo): ${total_cost_display:.2f}"
+    footer_line2 = f"  └─ ⏳ {status['days_remaining']} days left (avg. {status['avg_sessions_per_day']:.1f} sessions/day) | 📡 Data: {format_data_age(status['data_age'], coarse=idle)} | Ctrl+C to exit"
+    runs_out = (status.get("sessions_forecast") or {}).get("runs_out")
+    if runs_out:
+        footer_line2 += f"\n  └─ {Colors.WARNING}⚠ At this pace sessions run out on {runs_out}{Colors.ENDC}"
+    frame.append(footer_line1)
+    frame.append(footer_line2)
+    if profile:
+        frame.append(format_profile_line(metrics))
+    return "\n".join(frame).split("\n")
+
+def refresh_timeout(status: dict) -> float:
+    config_instance = Config.instance()
+    if status is not None and status["active_block"] is None:
+        return min(config_instance.IDLE_REFRESH_INTERVAL_SECONDS, 60 - time.time() % 60)
+    return config_instance.REFRESH_INTERVAL_SECONDS
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def run_display(get_status, wake: threading.Event, on_exit=None, profile: bool = False, render=None,
+                placeholder: str = None, interval: float = None):
+    """Render `get_status()` until Ctrl+C; `wake` interrupts the wait between frames.
+
+    `render` replaces render_frame() for other kinds of status (e.g. the --profiles rows);
+    `placeholder()` gives the text render_frame() shows while there is no status.
+    `interval` fixes the wait between frames, for callers whose `wake` is never set by new data.
+    """
+    metrics = Metrics.instance()
+    renderer = FrameRenderer()
+    if hasattr(signal, "SIGWINCH"):
+        # A resize wakes the loop early; the renderer notices the new size and redraws fully
+        signal.signal(signal.SIGWINCH, lambda signum, frame: wake.set())
+    for name in ("SIGTERM", "SIGHUP"):
+        if hasattr(signal, name):
+            # Take the Ctrl+C exit path, so deferred state is flushed
+            signal.signal(getattr(signal, name), _raise_keyboard_interrupt)
+    while True:
+        try:
+            status = get_status()
+            with metrics.phase("render"):
+                renderer.draw(render(status) if render else render_frame(status, profile, placeholder and placeholder()))
+            if "first_frame_seconds" not in metrics.gauges:
+                metrics.set_gauge("first_frame_seconds", round(time.perf_counter() - Metrics.STARTED_AT, 4))
+            if interval is None:
+                interval_now = Config.instance().REFRESH_INTERVAL_SECONDS if render else refresh_timeout(status)
+            else:
+                interval_now = interval
+            wake.wait(interval_now)
+            wake.clear()
+        except KeyboardInterrupt:
+            if on_exit:
+                on_exit()
+            renderer.close()
+            print(f"\n\n{Colors.WARNING}Closing monitor...{Colors.ENDC}")
+            sys.exit(0)
+
+# --- Daemon ---
+
+class StatusServer:
+    """Serves the latest status dict over a Unix domain socket (localhost TCP on Windows).
+
+    Clients send one command line and receive one line in reply: "status" and "timings" answer
+    JSON (the status dict, a Metrics snapshot), "metrics" answers Prometheus text.
+    """
+
+    def __init__(self):
+        import socket
+        import socketserver
+        self._status = None
+        server = self
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                command = self.rfile.readline().decode("utf-8", "replace").strip() or "status"
+                self.wfile.write(server.respond(command).encode("utf-8") + b"\n")
+        config = Config.instance()
+        os.makedirs(config.CONFIG_DIR, exist_ok=True)
+        if hasattr(socket, "AF_UNIX"):
+            if os.path.exists(config.SOCKET_FILE):
+                if query_daemon("status") is not None:
+                    raise RuntimeError(f"Another monitor daemon is already listening on {config.SOCKET_FILE}")
+                os.unlink(config.SOCKET_FILE)
+            self._server = socketserver.ThreadingUnixStreamServer(config.SOCKET_FILE, Handler)
+            self.address = config.SOCKET_FILE
+        else:
+            self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+            self.address = "127.0.0.1:%d" % self._server.server_address[1]
+            with open(config.SOCKET_FILE + ".port", 'w') as f:
+                f.write(str(self._server.server_address[1]))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="status-server", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def publish(self, status: dict):
+        self._status = status
+
+    def respond(self, command: str) -> str:
+        if command == "status":
+            return json.dumps(self._status)
+        if command == "metrics":
+            return Metrics.instance().to_prometheus()
+        if command == "timings":
+            return Metrics.instance().to_json_line()
+        return json.dumps({"error": f"unknown command: {command}"})
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        config = Config.instance()
+        for path in (config.SOCKET_FILE, config.SOCKET_FILE + ".port"):
+            if os.path.exists(path):
+                os.unlink(path)
+
+def query_daemon(command: str = "status", timeout: float = 1.0):
+    """Send one command to a running daemon. Returns the decoded reply, or None if unreachable."""
+    import socket
+    config = Config.instance()
+    try:
+        if hasattr(socket, "AF_UNIX"):
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = config.SOCKET_FILE
+        else:
+            with open(config.SOCKET_FILE + ".port") as f:
+                address = ("127.0.0.1", int(f.read().strip()))
+            client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        with client:
+            client.settimeout(timeout)
+            client.connect(address)
+            client.sendall(command.encode("utf-8") + b"\n")
+            chunks = []
+            while True:
+                chunk = client.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return json.loads(b"".join(chunks))
+    except (OSError, ValueError):
+        return None
+
+# --- Multi-profile Mode ---
+
+class Profile:
+    """One Claude account / config directory monitored by --profiles, with its own settings and state."""
+
+    def __init__(self, name: str, claude_config_dir: str = None, start_day: int = 1, timezone: str = None,
+                 total_sessions: int = None, state_dir: str = None, timeout: float = None):
+        config = Config.instance()
+        if not name or os.sep in name:
+            raise ValueError(f"invalid profile name {name!r}")
+        if not 1 <= start_day <= 31:
+            raise ValueError(f"profile {name}: start_day must be between 1 and 31")
+        self.name = name
+        self.claude_config_dir = os.path.expanduser(claude_config_dir) if claude_config_dir else None
+        self.start_day = start_day
+        self.tz = ZoneInfo(timezone) if timezone else config.LOCAL_TZ
+        self.total_sessions = total_sessions or config.TOTAL_MONTHLY_SESSIONS
+        self.state_dir = os.path.expanduser(state_dir) if state_dir else os.path.join(config.PROFILES_DIR, name)
+        self.timeout = timeout or config.CCUSAGE_TIMEOUT_SECONDS
+
+    def env(self) -> dict:
+        """Environment for this profile's ccusage runs."""
+        if not self.claude_config_dir:
+            return None
+        return dict(os.environ, CLAUDE_CONFIG_DIR=self.claude_config_dir)
+
+def load_profiles(path: str) -> list:
+    """Read a profiles file: a JSON list (or {"profiles": [...]}) of Profile keyword arguments."""
+    with open(os.path.expanduser(path)) as f:
+        data = json.load(f)
+    entries = data.get("profiles") if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("expected a non-empty list of profiles")
+    profiles = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError(f"expected a JSON object per profile, got {entry!r}")
+        try:
+            profiles.append(Profile(**entry))
+        except (TypeError, KeyError) as e:
+            # Unknown keys, or an unknown timezone (ZoneInfoNotFoundError is a KeyError)
+            raise ValueError(f"profile {entry.get('name', '?')}: {e}") from None
+    names = [p.name for p in profiles]
+    if len(set(names)) != len(names):
+        raise ValueError("profile names must be unique")
+    return profiles
+
+class ProfilePool:
+    """Runs the fetchers' fetch_once() in a bounded thread pool.
+
+    Each fetcher has at most one fetch in flight and is due every `interval` seconds
+    (or right after refresh()); its own timeout bounds the ccusage run, so a slow
+    profile only delays itself.
+    """
+
+    def __init__(self, fetchers: list, workers: int = None, interval: float = None):
+        from concurrent.futures import ThreadPoolExecutor
+        config = Config.instance()
+        self.fetchers = fetchers
+        self.interval = interval if interval is not None else config.CCUSAGE_FETCH_INTERVAL_SECONDS
+        workers = workers or config.PROFILE_FETCH_WORKERS
+        self._executor = ThreadPoolExecutor(max_workers=min(workers, len(fetchers)), thread_name_prefix="profile-fetch")
+        self._in_flight = [None] * len(fetchers)
+        self._due = [0.0] * len(fetchers)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="profile-pool", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        poll = Config.instance().WATCH_POLL_INTERVAL_SECONDS
+        while not self._stop.is_set():
+            now = time.time()
+            for i, fetcher in enumerate(self.fetchers):
+                future = self._in_flight[i]
+                if future is not None and not future.done():
+                    continue
+                if fetcher.take_refresh() or now >= self._due[i]:
+                    self._due[i] = now + self.interval
+                    self._in_flight[i] = self._executor.submit(fetcher.fetch_once)
+            self._stop.wait(poll)
+
+class _ProfileNotifier:
+    """Prefixes a profile's alerts with its name on the shared dispatcher."""
+
+    def __init__(self, dispatcher: NotificationDispatcher, name: str):
+        self.dispatcher = dispatcher
+        self.name = name
+
+    def notify(self, message: str):
+        self.dispatcher.notify(f"[{self.name}] {message}")
+
+    def close(self, timeout: float = None):
+        pass
+
+def start_profile_monitor(profile: Profile, args, notifier: NotificationDispatcher = None, wake: threading.Event = None):
+    """Per-profile store, aggregator and (pool-driven) fetcher; the first fetch folds in the period."""
+    store = HistoryStore(os.path.join(profile.state_dir, "history.db"))
+    try:
+        aggregator = PeriodAggregator(store, profile.start_day)
+    except Exception:
+        store.close()
+        raise
+    since = aggregator.period_start.strftime('%Y%m%d')
+    source = None
+    if args.native:
+        dirs = [profile.claude_config_dir] if profile.claude_config_dir else None
+        source = TranscriptReader(data_dirs=dirs, since_date=since).fetch_indexed
+    fetcher = UsageFetcher(since, timeout=profile.timeout, source=source, env=profile.env(),
+                           on_change=wake.set if wake else None)
+    profile_args = argparse.Namespace(start_day=profile.start_day, metrics_file=None, ceiling=args.ceiling)
+    return Monitor(profile_args, store, aggregator, fetcher,
+                   _ProfileNotifier(notifier, profile.name) if notifier else None,
+                   total_sessions=profile.total_sessions, status_file=os.path.join(profile.state_dir, "status.json"))
+
+def format_profile_row(profile: Profile, status: dict, width: int) -> str:
+    name = f"{Colors.BOLD}{profile.name:<{width}}{Colors.ENDC}"
+    if status is not None and "error" in status:
+        return f"{name}  {Colors.FAIL}error: {status['error']}{Colors.ENDC}"
+    if status is None or status["data_age"] is None:
+        return f"{name}  {Colors.WARNING}waiting for data{Colors.ENDC}"
+    active = status["active_block"]
+    if active:
+        percent = active["token_percent"]
+        color = Colors.FAIL if percent >= 90 else Colors.WARNING if percent >= 75 else Colors.GREEN
+        usage = (f"{color}{create_progress_bar(percent, 20)}{Colors.ENDC} {percent:5.1f}% "
+                 f"{format_timedelta(timedelta(seconds=active['time_remaining']))}")
+        rate = active.get("tokens_per_minute")
+        if rate is not None:
+            usage += f" {rate:,.0f} tok/min"
+        eta = active.get("limit_eta")
+        if eta is not None and eta < active["end"]:
+            usage += f" {Colors.WARNING}limit ~{datetime.fromtimestamp(eta, profile.tz).strftime('%H:%M')}{Colors.ENDC}"
+    else:
+        usage = f"{'idle':<33}"
+    return (f"{name}  {usage} | {status['sessions_left']} left | ${status['monthly_cost']:.2f} | "
+            f"{format_data_age(status['data_age'])}")
+
+def render_profiles_frame(rows: list) -> list:
+    """One compact line per (profile, status) pair; a status {"error": ...} marks a failed profile."""
+    width = max(len(profile.name) for profile, _ in rows)
+    frame = [f"{Colors.HEADER}{Colors.BOLD}✦ ✧ ✦ CLAUDE SESSION MONITOR ✦ ✧ ✦{Colors.ENDC}",
+             f"{Colors.HEADER}{'=' * 35}{Colors.ENDC}", ""]
+    frame += [format_profile_row(profile, status, width) for profile, status in rows]
+    frame.append("=" * 60)
+    frame.append(f"⏰ {datetime.now(Config.instance().LOCAL_TZ).strftime('%H:%M:%S')} | {len(rows)} profiles | Ctrl+C to exit")
+    return frame
+
+def run_profiles(args):
+    """Monitor several Claude config directories at once, one row per profile."""
+    try:
+        profiles = load_profiles(args.profiles)
+    except (OSError, ValueError) as e:
+        print(f"{Colors.FAIL}Error: Cannot load profiles from {args.profiles}: {e}{Colors.ENDC}")
+        sys.exit(1)
+    wake = threading.Event()
+    notifier = NotificationDispatcher().start()
+    # A profile that cannot start (e.g. an unusable state_dir) becomes an error row, not a fatal error
+    monitors, errors = [], {}
+    for profile in profiles:
+        try:
+            monitors.append(start_profile_monitor(profile, args, notifier, wake))
+        except Exception as e:
+            monitors.append(None)
+            errors[profile.name] = {"error": f"{type(e).__name__}: {e}"}
+    running = [monitor for monitor in monitors if monitor is not None]
+    pool = ProfilePool([monitor.fetcher for monitor in running]).start() if running else None
+
+    def status(profile, monitor):
+        if monitor is None:
+            return errors[profile.name]
+        try:
+            return monitor.tick()
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+
+    def close():
+        if pool:
+            pool.close()
+        for monitor in running:
+            monitor.close()
+        notifier.close(timeout=Config.instance().NOTIFICATION_TIMEOUT_SECONDS)
+    run_display(lambda: [(profile, status(profile, monitor)) for profile, monitor in zip(profiles, monitors)],
+                wake, on_exit=close, render=render_profiles_frame)
+
+# --- Record and Replay ---
+
+class SnapshotRecorder:
+    """Appends fetched payloads to a gzip-compressed JSON-lines log (--record).
+
+    Each line is {"t": fetched_at, "keep": n, "blocks": [...]}: the first `n` blocks are
+    unchanged from the previous line, so only the changed tail is stored. The stream is
+    sync-flushed after every line, so a crash loses at most the line being written.
+    """
+
+    def __init__(self, path: str):
+        import gzip
+        self.path = path
+        self._file = gzip.open(path, 'ab')
+        self._previous = []
+        self._lock = threading.Lock()
+
+    def record(self, timestamp: float, data: dict):
+        blocks = data.get("blocks", [])
+        previous = self._previous
+        keep, limit = 0, min(len(blocks), len(previous))
+        # Merged fetches share the unchanged block dicts, so the identity check usually decides
+        while keep < limit and (blocks[keep] is previous[keep] or blocks[keep] == previous[keep]):
+            keep += 1
+        line = json.dumps({"t": timestamp, "keep": keep, "blocks": blocks[keep:]}, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line.encode("utf-8") + b"\n")
+            self._file.flush()
+        self._previous = blocks
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def load_recording(path: str) -> list:
+    """Read a --record log into [(timestamp, data)], stopping at a truncated tail."""
+    import gzip
+    import zlib
+    records, blocks = [], []
+    try:
+        with gzip.open(path, 'rt', encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                # A new recording session appended to the same file starts from scratch (keep == 0)
+                blocks = blocks[:entry["keep"]] + entry["blocks"]
+                records.append((entry["t"], {"blocks": blocks}))
+    except (EOFError, zlib.error):
+        pass
+    return records
+
+class VirtualClock:
+    """Scaled stand-in for time.time, datetime.now and date.today during --replay.
+
+    install() rebinds the module's `time`, `datetime` and `date` names, so every part of
+    the monitor sees the virtual time (time.monotonic included, for the alert windows).
+    advance() exists for the manually stepped clock of benchmarks/bench_replay.py, which
+    builds it with speed=0 so that it only moves on advance() (--speed has no such value).
+    """
+
+    def __init__(self, start: float, speed: float = 1.0):
+        self._real_time = time
+        self._base = start
+        self._real_start = time.time()
+        self.speed = speed
+
+    def now(self) -> float:
+        return self._base + (self._real_time.time() - self._real_start) * self.speed
+
+    def advance(self, seconds: float):
+        self._base += seconds
+
+    def install(self):
+        clock = self
+        real_time = self._real_time
+
+        class VirtualTime:
+            def __getattr__(self, name):
+                return getattr(real_time, name)
+
+            def time(self):
+                return clock.now()
+
+            def monotonic(self):
+                return clock.now()
+
+        class VirtualDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return cls.fromtimestamp(clock.now(), tz)
+
+        class VirtualDate(date):
+            @classmethod
+            def today(cls):
+                return cls.fromtimestamp(clock.now())
+
+        globals().update(time=VirtualTime(), datetime=VirtualDatetime, date=VirtualDate)
+        return self
+
+class SnapshotReplay:
+    """Serves the recorded payload current at the virtual time, in place of a fetch."""
+
+    def __init__(self, records: list, clock: VirtualClock = None):
+        self.records = records
+        self.times = [t for t, _ in records]
+        self.clock = clock
+
+    @property
+    def start_time(self) -> float:
+        return self.times[0]
+
+    @property
+    def end_time(self) -> float:
+        """The last record (or the end of the block still active in it), plus a minute to fold it in."""
+        ends = [b.end for b in BlockIndex.from_data(self.records[-1][1]) if b.is_active]
+        return max([self.times[-1]] + ends) + 60
+
+    def fetch(self) -> dict:
+        index = bisect.bisect_right(self.times, self.clock.now()) - 1
+        return self.records[index][1] if index >= 0 else {"blocks": []}
+
+class _ReplayAlertLog(RecordingBackend):
+    """Keeps replayed alerts with their virtual time instead of showing them."""
+    name = "replay"
+
+    def send(self, title: str, message: str, timeout: float = None):
+        self.sent.append((time.time(), title, message))
+
+def parse_speed(text: str) -> float:
+    """'60x' or '60' -> 60.0"""
+    speed = float(text.lower().rstrip("x"))
+    if speed <= 0:
+        raise ValueError("speed must be positive")
+    return speed
+
+def run_replay(args):
+    """Run the monitor against a --record log with a virtual clock, isolated from the real state."""
+    import tempfile
+    try:
+        records = load_recording(args.replay)
+        speed = parse_speed(args.speed)
+    except (OSError, ValueError) as e:
+        print(f"{Colors.FAIL}Error: Cannot replay {args.replay}: {e}{Colors.ENDC}")
+        sys.exit(1)
+    if not records:
+        print(f"{Colors.FAIL}Error: {args.replay} contains no snapshots{Colors.ENDC}")
+        sys.exit(1)
+    clock = VirtualClock(records[0][0], speed)
+    replay = SnapshotReplay(records, clock)
+    config = Config.instance()
+    state_dir = tempfile.mkdtemp(prefix="claude-monitor-replay-")
+    # Replayed sessions must not end up in the real history or status file
+    config.HISTORY_DB_FILE = os.path.join(state_dir, "history.db")
+    config.STATUS_FILE = os.path.join(state_dir, "status.json")
+    clock.install()
+
+    store = HistoryStore()
+    aggregator = PeriodAggregator(store, args.start_day)
+    aggregator.rebuild(BlockIndex.from_data(replay.fetch()))
+    wake = threading.Event()
+    fetcher = UsageFetcher(aggregator.period_start.strftime('%Y%m%d'), source=replay.fetch, on_change=wake.set,
+                           interval=max(0.05, config.CCUSAGE_FETCH_INTERVAL_SECONDS / speed)).start()
+    alerts = _ReplayAlertLog()
+    monitor = Monitor(args, store, aggregator, fetcher, NotificationDispatcher([alerts], time_scale=speed).start())
+    end_time = replay.end_time
+    config.REFRESH_INTERVAL_SECONDS = config.REFRESH_INTERVAL_SECONDS / min(speed, 10)
+    config.IDLE_REFRESH_INTERVAL_SECONDS = config.IDLE_REFRESH_INTERVAL_SECONDS / speed
+
+    def get_status():
+        if clock.now() > end_time:
+            raise KeyboardInterrupt
+        return monitor.tick()
+
+    def on_exit():
+        monitor.close()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    try:
+        run_display(get_status, wake, on_exit=on_exit, profile=args.profile)
+    finally:
+        # Printed after the display has released the terminal
+        print(f"Replayed {len(records)} snapshots "
+              f"({format_timedelta(timedelta(seconds=clock.now() - records[0][0]))} at {speed:g}x).")
+        for at, _, message in alerts.sent:
+            print(f"  {datetime.fromtimestamp(at, config.LOCAL_TZ).strftime('%Y-%m-%d %H:%M:%S')}  {message}")
+
+# --- Usage Report ---
+
+REPORT_GROUPINGS = ("day", "week", "period", "hour")
+
+def _import_numpy():
+    """NumPy speeds up `report` when installed; it is never required."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+class BlockColumns:
+    """Completed blocks as columns (start, session length, tokens, cost) for bulk aggregation.
+
+    The columns are stdlib `array`s, viewed as NumPy arrays without copying when NumPy
+    is installed. Unknown session lengths are NaN.
+    """
+
+    def __init__(self, rows, use_numpy: bool = True):
+        from array import array
+        start, length, tokens, cost = array('d'), array('d'), array('d'), array('d')
+        nan = float("nan")
+        for block_start, last_activity, block_tokens, block_cost in rows:
+            start.append(block_start)
+            length.append(last_activity - block_start if last_activity else nan)
+            tokens.append(block_tokens)
+            cost.append(block_cost)
+        self.np = _import_numpy() if use_numpy else None
+        if self.np is not None:
+            start, length, tokens, cost = (self.np.frombuffer(column, dtype=self.np.float64)
+                                           for column in (start, length, tokens, cost))
+        self.start, self.length, self.tokens, self.cost = start, length, tokens, cost
+
+    def __len__(self):
+        return len(self.start)
+
+    @staticmethod
+    def store_rows(store: HistoryStore, since: str = None, until: str = None):
+        return ((parse_utc_epoch(start), parse_utc_epoch(actual_end) if actual_end else None, tokens, cost)
+                for start, actual_end, tokens, cost in store.block_rows(since, until))
+
+    @staticmethod
+    def block_rows(blocks):
+        return ((b.start, b.last_activity, b.total_tokens, b.cost_usd) for b in blocks if not b.is_active)
+
+    @classmethod
+    def from_store(cls, store: HistoryStore, since: str = None, use_numpy: bool = True):
+        return cls(cls.store_rows(store, since), use_numpy)
+
+    @classmethod
+    def from_blocks(cls, blocks, use_numpy: bool = True):
+        return cls(cls.block_rows(blocks), use_numpy)
+
+def _utc_offset(tz, epoch: float) -> float:
+    return datetime.fromtimestamp(epoch, tz).utcoffset().total_seconds()
+
+def _period_start_day(day: int, start_day: int) -> int:
+    """Billing period start (days since the epoch) of the local day `day`."""
+    epoch = date(1970, 1, 1)
+    return (get_period_start_for(epoch + timedelta(days=day), start_day) - epoch).days
+
+def _group_keys_numpy(np, start, by: str, tz, start_day: int):
+    # Offsets only change at DST transitions: look them up once per distinct UTC hour
+    hours, hour_index = np.unique((start // 3600).astype(np.int64), return_inverse=True)
+    local = start + np.array([_utc_offset(tz, h * 3600) for h in hours.tolist()])[hour_index]
+    if by == "hour":
+        return (local // 3600 % 24).astype(np.int64)
+    days = (local // 86400).astype(np.int64)
+    if by == "day":
+        return days
+    if by == "week":
+        # Epoch day 0 was a Thursday; keys are the Monday of each week
+        return days - (days + 3) % 7
+    unique_days, day_index = np.unique(days, return_inverse=True)
+    return np.array([_period_start_day(d, start_day) for d in unique_days.tolist()], dtype=np.int64)[day_index]
+
+def _aggregate_numpy(columns: BlockColumns, by: str, tz, start_day: int) -> list:
+    np = columns.np
+    keys = _group_keys_numpy(np, columns.start, by, tz, start_day)
+    groups, index = np.unique(keys, return_inverse=True)
+    n = len(groups)
+    sessions = np.bincount(index, minlength=n)
+    tokens = np.bincount(index, weights=columns.tokens, minlength=n)
+    cost = np.bincount(index, weights=columns.cost, minlength=n)
+    known = ~np.isnan(columns.length)
+    length_sum = np.bincount(index[known], weights=columns.length[known], minlength=n)
+    length_count = np.bincount(index[known], minlength=n)
+    peak = np.zeros(n)
+    np.maximum.at(peak, index, columns.tokens)
+    return [_report_row(by, *values) for values in zip(groups.tolist(), sessions.tolist(), tokens.tolist(),
+                                                       cost.tolist(), length_sum.tolist(), length_count.tolist(),
+                                                       peak.tolist())]
+
+def _aggregate_stdlib(columns: BlockColumns, by: str, tz, start_day: int) -> list:
+    offsets, periods, totals = {}, {}, {}
+    for start, length, tokens, cost in zip(columns.start, columns.length, columns.tokens, columns.cost):
+        hour = int(start // 3600)
+        if hour not in offsets:
+            offsets[hour] = _utc_offset(tz, hour * 3600)
+        local = start + offsets[hour]
+        if by == "hour":
+            key = int(local // 3600 % 24)
+        else:
+            key = int(local // 86400)
+            if by == "week":
+                key -= (key + 3) % 7
+            elif by == "period":
+                if key not in periods:
+                    periods[key] = _period_start_day(key, start_day)
+                key = periods[key]
+        group = totals.get(key)
+        if group is None:
+            group = totals[key] = [0, 0.0, 0.0, 0.0, 0, 0.0]
+        group[0] += 1
+        group[1] += tokens
+        group[2] += cost
+        if length == length:  # not NaN
+            group[3] += length
+            group[4] += 1
+        group[5] = max(group[5], tokens)
+    return [_report_row(by, key, *totals[key]) for key in sorted(totals)]
+
+def _report_row(by: str, key: int, sessions: int, tokens: float, cost: float, length_sum: float,
+                length_count: int, peak: float) -> dict:
+    label = f"{key:02d}:00" if by == "hour" else (date(1970, 1, 1) + timedelta(days=key)).isoformat()
+    return {by: label, "sessions": int(sessions), "tokens": int(tokens), "cost_usd": round(cost, 4),
+            "avg_session_minutes": round(length_sum / length_count / 60, 1) if length_count else None,
+            "peak_block_tokens": int(peak)}
+
+def aggregate_report(columns: BlockColumns, by: str, tz, start_day: int) -> list:
+    """Sessions, tokens, cost, average session length and peak block per day/week/period/hour-of-day."""
+    if not len(columns):
+        return []
+    if columns.np is not None:
+        return _aggregate_numpy(columns, by, tz, start_day)
+    return _aggregate_stdlib(columns, by, tz, start_day)
+
+def format_report(rows: list, by: str, output_format: str) -> str:
+    if output_format == "json":
+        return json.dumps(rows, indent=2)
+    fields = [by, "sessions", "tokens", "cost_usd", "avg_session_minutes", "peak_block_tokens"]
+    if output_format == "csv":
+        import csv
+        import io
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue().rstrip("\n")
+    headers = [by.capitalize(), "Sessions", "Tokens", "Cost", "Avg length", "Peak block"]
+    table = [[row[by], f"{row['sessions']:,}", f"{row['tokens']:,}", f"${row['cost_usd']:,.2f}",
+              f"{row['avg_session_minutes']:.0f}m" if row["avg_session_minutes"] is not None else "-",
+              f"{row['peak_block_tokens']:,}"] for row in rows]
+    table.append(["Total", f"{sum(r['sessions'] for r in rows):,}", f"{sum(r['tokens'] for r in rows):,}",
+                  f"${sum(r['cost_usd'] for r in rows):,.2f}", "", f"{max((r['peak_block_tokens'] for r in rows), default=0):,}"])
+    widths = [max(len(str(cells[i])) for cells in [headers] + table) for i in range(len(headers))]
+    def line(cells):
+        return "  ".join(str(cell).ljust(width) if i == 0 else str(cell).rjust(width)
+                         for i, (cell, width) in enumerate(zip(cells, widths)))
+    rule = "-" * len(line(headers))
+    return "\n".join([f"{Colors.BOLD}{line(headers)}{Colors.ENDC}", rule] + [line(cells) for cells in table[:-1]]
+                     + [rule, line(table[-1])])
+
+def coverage_gaps(coverage: list, start: str, end: str) -> list:
+    """The [start, end] spans not covered by the sorted, disjoint `coverage` spans."""
+    gaps, cursor = [], start
+    for span_start, span_end in coverage:
+        if span_end <= cursor:
+            continue
+        if span_start >= end:
+            break
+        if span_start > cursor:
+            gaps.append([cursor, span_start])
+        cursor = span_end
+    if cursor < end:
+        gaps.append([cursor, end])
+    return gaps
+
+def _report_columns_from_store(store: HistoryStore, since):
+    """BlockColumns from the history index, with the spans it does not cover read from ccusage.
+
+    Returns None when the index has no recorded coverage yet; messages go to stderr.
+    """
+    import itertools
+    since_iso = format_utc_iso(calendar.timegm(since.timetuple())) if since else None
+    coverage = store.coverage()
+    if not coverage:
+        return None
+    if since_iso is None and coverage[0][0]:
+        print(f"{Colors.CYAN}History index covers sessions since {coverage[0][0][:10]}; "
+              f"use --fetch for the full ccusage history.{Colors.ENDC}", file=sys.stderr)
+    # A running monitor records its coverage at most one flush interval late
+    end = format_utc_iso(time.time() - 2 * Config.instance().STATE_FLUSH_INTERVAL_SECONDS)
+    gaps = coverage_gaps(coverage, since_iso or coverage[0][0], end)
+    if not gaps:
+        return BlockColumns.from_store(store, since_iso)
+    missing = ", ".join(f"{gap_start[:10]} to {gap_end[:10]}" for gap_start, gap_end in gaps)
+    print(f"{Colors.CYAN}History index is missing {missing}; reading sessions from "
+          f"{gaps[0][0][:10]} on from ccusage...{Colors.ENDC}", file=sys.stderr)
+    # Blocks still open when the gap began were not stored either
+    cut = parse_utc_epoch(gaps[0][0]) - SESSION_DURATION_SECONDS
+    since_epoch = calendar.timegm(since.timetuple()) if since else cut
+    first = max(cut, since_epoch)
+    fetched = (b for b in iter_ccusage_blocks(datetime.fromtimestamp(first - 86400).strftime('%Y%m%d'))
+               if b.start >= first)
+    try:
+        return BlockColumns(itertools.chain(BlockColumns.store_rows(store, since_iso, format_utc_iso(first)),
+                                            BlockColumns.block_rows(fetched)))
+    except OSError as e:
+        print(f"{Colors.WARNING}Failed to fetch usage data ({e}); the report lacks {missing}.{Colors.ENDC}",
+              file=sys.stderr)
+        return BlockColumns.from_store(store, since_iso)
+
+def run_report(argv: list) -> int:
+    """`claude_monitor.py report`: aggregate the recorded block history."""
+    user_settings = load_config().get("user_settings", {})
+    parser = argparse.ArgumentParser(prog="claude_monitor.py report",
+                                     description="Summarize the session history by day, week, billing period or hour of day.")
+    parser.add_argument("--by", choices=REPORT_GROUPINGS, default="day", help="Grouping. Default: day")
+    parser.add_argument("--format", choices=["table", "csv", "json"], default="table", help="Output format. Default: table")
+    parser.add_argument("--since", metavar="YYYY-MM-DD", help="Only include sessions starting on or after this date (UTC).")
+    parser.add_argument("--start-day", type=int, default=user_settings.get("start_day", 1),
+                        help="Billing period start day for --by period.")
+    parser.add_argument("--timezone", default=user_settings.get("timezone", "Europe/Warsaw"),
+                        help="Timezone used to assign sessions to days and hours.")
+    parser.add_argument("--fetch", action="store_true",
+                        help="Read the full history from ccusage instead of the local history index.")
+    args = parser.parse_args(argv)
+    try:
+        tz = ZoneInfo(args.timezone)
+        since = datetime.strptime(args.since, '%Y-%m-%d') if args.since else None
+    except Exception as e:
+        print(f"{Colors.FAIL}Error: {e}{Colors.ENDC}", file=sys.stderr)
+        return 2
+
+    columns = None
+    if not args.fetch and os.path.exists(Config.instance().HISTORY_DB_FILE):
+        # The index only holds what this monitor has seen (or a --recalculate), possibly with holes
+        store = HistoryStore()
+        columns = _report_columns_from_store(store, since)
+        store.close()
+    if columns is None:
+        print(f"{Colors.CYAN}Reading history from ccusage...{Colors.ENDC}", file=sys.stderr)
+        try:
+            columns = BlockColumns.from_blocks(iter_ccusage_blocks(since.strftime('%Y%m%d') if since else None))
+        except OSError as e:
+            print(f"{Colors.FAIL}Failed to fetch usage data: {e}{Colors.ENDC}", file=sys.stderr)
+            return 1
+    print(format_report(aggregate_report(columns, args.by, tz, args.start_day), args.by, args.format))
+    return 0
+
+# --- One-shot Status ---
+
+def load_status_snapshot():
+    try:
+        with open(Config.instance().STATUS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def fetch_status_once(args):
+    """Bounded-time fallback for `--once` when no fresh snapshot or daemon is available."""
+    store = HistoryStore()
+    aggregator = PeriodAggregator(store, args.start_day)
+    since = aggregator.period_start.strftime('%Y%m%d')
+    source = TranscriptReader(since_date=since).fetch_indexed if args.native else None
+    fetcher = UsageFetcher(since, timeout=Config.instance().ONCE_FETCH_TIMEOUT_SECONDS, source=source)
+    if fetcher.fetch_once() is None:
+        store.close()
+        return None
+    monitor = Monitor(args, store, aggregator, fetcher)
+    status = monitor.tick()
+    monitor.close()
+    return status
+
+def advance_status(status: dict, now: float) -> dict:
+    """Age a persisted status to `now`: data age grows and the session clock runs down."""
+    elapsed = max(0.0, now - status["generated_at"])
+    status = dict(status, generated_at=now)
+    if status["data_age"] is not None:
+        status["data_age"] += elapsed
+    active = status["active_block"]
+    if active:
+        if now > active["end"]:
+            status["active_block"] = None
+        else:
+            status["active_block"] = dict(active, time_remaining=active["end"] - now)
+    return status
+
+def snapshot_max_age(status: dict) -> float:
+    """How old a persisted status may get before its writer has surely stopped updating it."""
+    config_instance = Config.instance()
+    if status["active_block"] is None:
+        return config_instance.ONCE_MAX_SNAPSHOT_AGE_SECONDS + config_instance.IDLE_REFRESH_INTERVAL_SECONDS
+    return config_instance.ONCE_MAX_SNAPSHOT_AGE_SECONDS
+
+def format_status_line(status: dict, output_format: str) -> str:
+    if output_format == "json":
+        return json.dumps(status)
+    stale = status["data_age"] is None or status["data_age"] > snapshot_max_age(status)
+    active = status["active_block"]
+    sessions = f"{status['sessions_left']} sessions left"
+    cost = f"${status['monthly_cost']:.2f}"
+    if output_format == "tmux":
+        if active:
+            percent = active["token_percent"]
+            color = "red" if percent >= 90 else "yellow" if percent >= 75 else "green"
+            usage = f"#[fg={color}]{percent:.0f}%#[default] {format_timedelta(timedelta(seconds=active['time_remaining']))}"
+        else:
+            usage = "#[fg=colour244]idle#[default]"
+        line = f"{usage} | {sessions} | {cost}"
+        return line + " #[fg=yellow](stale)#[default]" if stale else line
+    if active:
+        usage = f"{active['token_percent']:.0f}% {format_timedelta(timedelta(seconds=active['time_remaining']))}"
+    else:
+        usage = "idle"
+    line = f"{usage} | {sessions} | {cost}"
+    return line + " (stale)" if stale else line
+
+def run_once(args) -> int:
+    """Print the current status once: persisted snapshot, then daemon, then a bounded fetch."""
+    now = time.time()
+    status = load_status_snapshot()
+    if status is None or now - status["generated_at"] > snapshot_max_age(status):
+        status = query_daemon("status", timeout=0.5) or fetch_status_once(args) or status
+    if status is None:
+        print("No usage data available", file=sys.stderr)
+        return 1
+    print(format_status_line(advance_status(status, time.time()), args.format))
+    return 0
+
+def start_monitor(args, wake: threading.Event = None, config: dict = None, log=print):
+    """Startup reconciliation: bring the history store up to date and start the fetcher.
+
+    Progress messages go to `log`, which defaults to stdout.
+    """
+    if config is None:
+        config = load_config()
+    store = watcher = recorder = None
+    try:
+        store = HistoryStore()
+        if any(key in config for key in HistoryStore.LEGACY_CONFIG_KEYS):
+            update_config(store.migrate_legacy_config)
+    
+        # Smart single data fetch - determine optimal date range
+        sub_start_date = get_subscription_period_start(args.start_day)
+        sub_start_date_str = sub_start_date.strftime('%Y-%m-%d')
+    
+        # Determine what data we need
+        need_full_rescan = args.recalculate
+        need_max_tokens = not store.get("max_tokens") or args.recalculate
+        need_monthly_recalc = args.recalculate or store.get("period_start") != sub_start_date_str
+    
+        if need_full_rescan:
+            log(f"{Colors.WARNING}Full recalculation - fetching all data...{Colors.ENDC}")
+            fetch_since = None  # Get everything
+        elif need_monthly_recalc:
+            log(f"{Colors.WARNING}New billing period - fetching data from {sub_start_date_str}...{Colors.ENDC}")
+            fetch_since = sub_start_date.strftime('%Y%m%d')
+        else:
+            # Incremental: get data from last week to catch any new sessions
+            last_check = store.get("last_incremental_update")
+            if last_check:
+                since_date = datetime.strptime(last_check, '%Y-%m-%d') - timedelta(days=2)
+            else:
+                since_date = datetime.now() - timedelta(days=7)
+            fetch_since = since_date.strftime('%Y%m%d')
+            log(f"{Colors.CYAN}Incremental update from {since_date.strftime('%Y-%m-%d')}...{Colors.ENDC}")
+    
+        # Single ccusage call! The native reader is kept and reused by the main loop,
+        # so it must cover the whole billing period as well.
+        reader = None
+        if args.native:
+            native_since = None if fetch_since is None else min(fetch_since, sub_start_date.strftime('%Y%m%d'))
+            reader = TranscriptReader(since_date=native_since)
+            data = reader.fetch()
+        elif need_full_rescan:
+            # The full history can be large: stream it through the aggregator instead of decoding it at once
+            data = None
+        else:
+            data = run_ccusage(fetch_since, timeout=Config.instance().CCUSAGE_TIMEOUT_SECONDS)
+        if data is not None and "blocks" not in data:
+            log(f"{Colors.FAIL}Failed to fetch usage data{Colors.ENDC}")
+            store.close()
+            return None
+    
+        blocks = BlockIndex.from_data(data) if data is not None else \
+            iter_ccusage_blocks(timeout=Config.instance().CCUSAGE_FULL_HISTORY_TIMEOUT_SECONDS)
+    
+        # Process max tokens and monthly data
+        aggregator = PeriodAggregator(store, args.start_day)
+        previous_max = aggregator.max_tokens
+        if need_monthly_recalc:
+            # Full monthly recalculation - rebuild the billing period in the history store
+            try:
+                aggregator.rebuild(blocks)
+            except OSError:
+                log(f"{Colors.FAIL}Failed to fetch usage data{Colors.ENDC}")
+                store.close()
+                return None
+            # A failed run_ccusage() also returns no blocks; then the fetcher marks the coverage later
+            if data is None or data["blocks"]:
+                if need_full_rescan:
+                    store.add_coverage("", format_utc_iso(time.time()))
+                else:
+                    aggregator.mark_covered(time.time(), defer=False)
+        else:
+            # Incremental update: only blocks missing from the store are new
+            new_sessions_found = aggregator.observe(blocks)
+            if new_sessions_found > 0:
+                log(f"{Colors.GREEN}Found {new_sessions_found} new completed sessions.{Colors.ENDC}")
+        if aggregator.max_tokens > previous_max:
+            if need_max_tokens:
+                store.set("last_max_tokens_scan", datetime.now().strftime('%Y-%m-%d'))
+            log(f"{Colors.GREEN}New maximum found: {aggregator.max_tokens:,} tokens.{Colors.ENDC}")
+    
+        store.set("last_incremental_update", datetime.now().strftime('%Y-%m-%d'))
+    
+        # Fetch when transcripts change; without watchable directories fall back to the fixed interval
+        watcher = None
+        if not args.no_watch and get_claude_data_dirs():
+            watcher = TranscriptWatcher()
+    
+        # Use billing period start date to get all sessions for current period
+        recorder = SnapshotRecorder(args.record) if getattr(args, "record", None) else None
+        fetcher = UsageFetcher(sub_start_date.strftime('%Y%m%d'), source=reader.fetch_indexed if reader else None,
+                               on_change=wake.set if wake else None, watcher=watcher, recorder=recorder).start()
+        return Monitor(args, store, aggregator, fetcher, NotificationDispatcher().start())
+    except Exception:
+        # Close what was opened, so that a retried startup leaks no connections or descriptors
+        for resource in (recorder, watcher, store):
+            if resource is not None:
+                try:
+                    resource.close()
+                except Exception:
+                    pass
+        raise
+
+class StartupReconciler:
+    """Runs start_monitor() on a background thread while the display shows the last saved status.
+
+    Until the monitor is ready, status() returns the persisted status.json aged to now and
+    marked stale with the latest startup message. A failed startup is retried.
+    """
+
+    def __init__(self, args, wake: threading.Event, config: dict = None):
+        self.args = args
+        self.wake = wake
+        self.config = config
+        self.monitor = None
+        self.message = f"{Colors.CYAN}Loading usage data...{Colors.ENDC}"
+        self.cached = load_status_snapshot()
+        if self.cached is not None and self.cached.get("version") != Config.instance().VERSION:
+            self.cached = None  # Another version may have saved other fields
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="startup", daemon=True)
+        self._thread.start()
+        return self
+
+    def _log(self, message: str):
+        self.message = message
+        self.wake.set()
+
+    def _run(self):
+        retry = Config.instance().CCUSAGE_FETCH_INTERVAL_SECONDS
+        config = self.config
+        while True:
+            started = time.perf_counter()
+            try:
+                monitor = start_monitor(self.args, self.wake, config, log=self._log)
+            except Exception as e:
+                # E.g. a locked history database or an unreadable lock file: show it and retry
+                self._log(f"{Colors.FAIL}Startup failed: {type(e).__name__}: {e}{Colors.ENDC}")
+                monitor = None
+            if monitor is not None:
+                Metrics.instance().set_gauge("startup_seconds", round(time.perf_counter() - started, 4))
+                self.monitor = monitor
+                self.wake.set()
+                return
+            self._log(f"{self.message} - retrying in {retry}s")
+            config = None
+            time.sleep(retry)
+
+    def status(self):
+        monitor = self.monitor
+        if monitor is not None:
+            return monitor.tick()
+        if self.cached is None:
+            return None
+        return dict(advance_status(self.cached, time.time()), stale=self.message)
+
+    def close(self):
+        if self.monitor is not None:
+            self.monitor.close()
+
+def main(args, config: dict = None):
+    # New data wakes the display early; otherwise it sleeps until the next tick
+    wake = threading.Event()
+    startup = StartupReconciler(args, wake, config).start()
+    run_display(startup.status, wake, on_exit=startup.close, profile=args.profile,
+                placeholder=lambda: startup.message)
+
+def run_daemon(args, config: dict = None):
+    """Headless mode: one fetch/aggregation/notification loop shared by all attached viewers."""
+    config_instance = Config.instance()
+    if query_daemon("status") is not None:
+        print(f"{Colors.FAIL}Error: A monitor daemon is already running.{Colors.ENDC}")
+        sys.exit(1)
+    monitor = start_monitor(args, config=config)
+    if monitor is None:
+        sys.exit(1)
+    try:
+        server = StatusServer().start()
+    except RuntimeError as e:
+        monitor.close()
+        print(f"{Colors.FAIL}Error: {e}{Colors.ENDC}")
+        sys.exit(1)
+    print(f"{Colors.GREEN}Monitor daemon listening on {server.address}{Colors.ENDC}")
+    stop = threading.Event()
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        while not stop.is_set():
+            server.publish(monitor.tick())
+            stop.wait(config_instance.REFRESH_INTERVAL_SECONDS)
+    except KeyboardInterrupt:
+        pass
+    server.close()
+    monitor.close()
+
+def attach(args):
+    """Viewer for a running daemon: renders its status without fetching anything itself.
+
+    Nothing wakes the viewer when the daemon has new data, so it polls every refresh interval;
+    --profile shows the daemon's timings, since the viewer has none of its own.
+    """
+    def render(status):
+        timings = query_daemon("timings") if args.profile else None
+        return render_frame(status, args.profile, metrics=timings or {})
+    run_display(lambda: query_daemon("status"), threading.Event(), profile=args.profile, render=render,
+                interval=Config.instance().REFRESH_INTERVAL_SECONDS)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["report"]:
+        sys.exit(run_report(sys.argv[2:]))
+    
+    # Load saved user settings
+    saved_config = load_config()
+    user_settings = saved_config.get("user_settings", {})
+    
+    parser = argparse.ArgumentParser(description="Monitor Claude API token and cost usage.", formatter_class=argparse.RawTextHelpFormatter,
+                                     epilog="History report: claude_monitor.py report [--by day|week|period|hour] (see report --help)")
+    parser.add_argument("--start-day", type=int, default=user_settings.get("start_day", 1), 
+                       help=f"Day of the month the billing period starts. Default: {user_settings.get('start_day', 1)}")
+    parser.add_argument("--recalculate", action="store_true", help="Forces re-scanning of history to update \nstored values (max tokens and costs).")
+    parser.add_argument("--test-alert", action="store_true", help="Sends a test system notification and exits.")
+    parser.add_argument("--timezone", type=str, default=user_settings.get("timezone", "Europe/Warsaw"), 
                        help=f"Timezone for display (e.g., 'America/New_York', 'UTC', 'Asia/Tokyo'). Default: {user_settings.get('timezone', 'Europe/Warsaw')}")
+    parser.add_argument("--ceiling", choices=TokenCeiling.MODES, default=user_settings.get("ceiling", "max"),
+                       help=f"Token limit for the usage bar: all-time max, p95/p99 of completed \nsessions, or a max decaying over 30 days. Default: {user_settings.get('ceiling', 'max')}")
+    parser.add_argument("--native", action="store_true", help="Read Claude transcript files directly instead of \nrunning ccusage (experimental).")
+    parser.add_argument("--no-watch", action="store_true", help="Fetch on a fixed interval instead of when transcript \nfiles change.")
+    parser.add_argument("--daemon", action="store_true", help="Run headless: fetch, aggregate and notify, serving the \ncurrent status to --attach clients over a local socket.")
+    parser.add_argument("--attach", action="store_true", help="Display the status served by a running --daemon.")
+    parser.add_argument("--once", action="store_true", help="Print the current status once and exit (for shell prompts \nand status bars).")
+    parser.add_argument("--format", choices=["json", "short", "tmux"], default="short", help="Output format for --once. Default: short")
+    parser.add_argument("--profile", action="store_true", help="Show per-phase timings (fetch, parse, render, ...) in the footer.")
+    parser.add_argument("--metrics-file", metavar="PATH", help="Export timings every 10s: Prometheus text if PATH ends \nwith .prom, otherwise appended JSON lines.")
+    parser.add_argument("--profiles", metavar="FILE", help="Monitor several Claude config directories at once; FILE is a \nJSON list of profiles (see README).")
+    parser.add_argument("--record", metavar="FILE", help="Append every fetched usage snapshot to FILE (gzip JSON lines) \nfor later --replay.")
+    parser.add_argument("--replay", metavar="FILE", help="Run the monitor against a --record log with a virtual clock \n(no ccusage, separate temporary state).")
+    parser.add_argument("--speed", default="60x", help="Replay speed, e.g. 60x (one hour per minute). Default: 60x")
     parser.add_argument("--save-settings", action="store_true", help="Save current start-day and timezone as defaults.")
     parser.add_argument("--version", action="version", version=f"Claude Session Monitor {Config.instance().VERSION}")
     args = parser.parse_args()
     
+    if args.once:
+        # Fast path for status bars: no screen clearing, no startup reconciliation
+        try:
+            Config.instance().set_timezone(args.timezone)
+        except Exception:
+            pass
+        sys.exit(run_once(args))
+    
     if args.test_alert:
         print(f"{Colors.CYAN}Sending test alert...{Colors.ENDC}")
-        show_notification("Test Notification", "If you see this, alerts are working correctly.")
-        print(f"{Colors.GREEN}Alert sending command executed.{Colors.ENDC}")
+        backend_name = show_notification("Test Notification", "If you see this, alerts are working correctly.")
+        if backend_name:
+            print(f"{Colors.GREEN}Alert sent via {backend_name}.{Colors.ENDC}")
+        else:
+            tried = ", ".join(b.name for b in get_notification_backends()) or "none available"
+            print(f"{Colors.WARNING}No notification backend succeeded (tried: {tried}).{Colors.ENDC}")
         sys.exit(0)
     
     if not 1 <= args.start_day <= 31:
         print(f"{Colors.FAIL}Error: Start day must be between 1 and 31.{Colors.ENDC}")
         sys.exit(1)
     
+    # The recorder is opened by the background startup; a bad path must fail here, not be retried there
+    if args.record:
+        try:
+            with open(args.record, 'ab'):
+                pass
+        except OSError as e:
+            print(f"{Colors.FAIL}Error: Cannot record to '{args.record}': {e.strerror}{Colors.ENDC}")
+            sys.exit(1)
+    
     # Validate and set timezone
     try:
         config = Config.instance()
@@ -513,15 +3201,25 @@ if __name__ == "__main__":
     
     # Handle --save-settings flag
     if args.save_settings:
-        saved_config["user_settings"] = {
+        update_config(lambda current: current.update(user_settings={
             "start_day": args.start_day,
-            "timezone": args.timezone
-        }
-        save_config(saved_config)
+            "timezone": args.timezone,
+            "ceiling": args.ceiling
+        }))
         print(f"{Colors.GREEN}Settings saved successfully!{Colors.ENDC}")
         print(f"  Start day: {args.start_day}")
         print(f"  Timezone: {args.timezone}")
+        print(f"  Ceiling: {args.ceiling}")
         print(f"\nThese will now be used as defaults when running claude_monitor.py")
         sys.exit(0)
-        
-    main(args)
+    
+    if args.replay:
+        run_replay(args)
+    elif args.profiles:
+        run_profiles(args)
+    elif args.attach:
+        attach(args)
+    elif args.daemon:
+        run_daemon(args, saved_config)
+    else:
+        main(args, saved_config)
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import claude_monitor as cm
+
+
+class TimedBackend(cm.RecordingBackend):
+    """RecordingBackend that also notes when each notification went out."""
+
+    def __init__(self):
+        super().__init__()
+        self.times = []
+
+    def send(self, title: str, message: str, timeout: float = None):
+        super().send(title, message, timeout)
+        self.times.append(time.monotonic())
+
+
+class NotificationDispatcherTest(unittest.TestCase):
+    """Coalescing, de-duplication and rate limiting, with the windows shortened."""
+
+    def setUp(self):
+        self.backend = TimedBackend()
+        self.dispatcher = cm.NotificationDispatcher([self.backend], title="Test")
+        self.dispatcher.coalesce_window = 0.05
+        self.dispatcher.min_interval = 0.3
+        self.dispatcher.start()
+
+    def tearDown(self):
+        self.dispatcher.close(timeout=2)
+
+    def wait_for(self, count: int, timeout: float = 2.0):
+        deadline = time.monotonic() + timeout
+        while len(self.backend.sent) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.backend.sent), count)
+
+    def test_alerts_of_one_frame_are_merged(self):
+        self.dispatcher.notify("Less than 30 minutes remaining in the session.")
+        self.dispatcher.notify("No activity for 10 minutes.")
+        self.wait_for(1)
+        self.assertEqual(self.backend.sent[0],
+                         ("Test", "Less than 30 minutes remaining in the session.\nNo activity for 10 minutes."))
+
+    def test_repeated_alert_is_dropped_within_dedup_window(self):
+        self.dispatcher.notify("No activity for 10 minutes.")
+        self.wait_for(1)
+        self.dispatcher.notify("No activity for 10 minutes.")
+        self.dispatcher.notify("Less than 30 minutes remaining in the session.")
+        self.wait_for(2)
+        self.assertEqual(self.backend.sent[1], ("Test", "Less than 30 minutes remaining in the session."))
+
+    def test_repeated_alert_is_sent_again_after_dedup_window(self):
+        self.dispatcher.dedup_window = 0.1
+        self.dispatcher.notify("No activity for 10 minutes.")
+        self.wait_for(1)
+        time.sleep(0.15)
+        self.dispatcher.notify("No activity for 10 minutes.")
+        self.wait_for(2)
+
+    def test_notifications_keep_the_minimum_interval(self):
+        self.dispatcher.notify("first")
+        self.wait_for(1)
+        self.dispatcher.notify("second")
+        self.wait_for(2)
+        self.assertGreaterEqual(self.backend.times[1] - self.backend.times[0], self.dispatcher.min_interval)
+
+    def test_close_delivers_what_is_queued(self):
+        self.dispatcher.coalesce_window = 10
+        self.dispatcher.notify("pending")
+        self.dispatcher.close(timeout=2)
+        self.assertEqual(self.backend.sent, [("Test", "pending")])
+
+
+if __name__ == "__main__":
+    unittest.main()
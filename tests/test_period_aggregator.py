@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import claude_monitor as cm
+
+HOUR = 3600
+
+
+class PeriodAggregatorTest(unittest.TestCase):
+    """Running totals against a full recompute over the same snapshot."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.store = cm.HistoryStore(os.path.join(self._tmp.name, "history.db"))
+        self.aggregator = cm.PeriodAggregator(self.store, 1)
+        self.period = self.aggregator.period_start_epoch
+
+    def tearDown(self):
+        self.store.close()
+        self._tmp.cleanup()
+
+    def block(self, start: float, tokens: int, cost: float, active: bool = False) -> cm.Block:
+        return cm.Block(cm.format_utc_iso(start), start, start + 5 * HOUR, tokens, cost, active)
+
+    def assert_totals(self, blocks: cm.BlockIndex, sessions: int, cost: float):
+        self.assertTrue(self.aggregator.is_consistent(blocks))
+        self.assertEqual(self.aggregator.sessions, sessions)
+        self.assertAlmostEqual(self.aggregator.cost, cost)
+
+    def test_snapshot_completion_and_rollover(self):
+        before_period = self.block(self.period - 10 * HOUR, 500, 9.0)
+        first = self.block(self.period + 1 * HOUR, 100, 1.0)
+        second = self.block(self.period + 7 * HOUR, 200, 2.0)
+        active = self.block(self.period + 13 * HOUR, 50, 0.5, active=True)
+
+        # A snapshot with two completed blocks in the period, one before it and one still open
+        snapshot = cm.BlockIndex([before_period, first, second, active])
+        self.assertEqual(self.aggregator.observe(snapshot), 2)
+        self.assert_totals(snapshot, 2, 3.0)
+        self.assertEqual(self.aggregator.max_tokens, max(35000, 500))
+
+        # The same snapshot again adds nothing
+        self.assertEqual(self.aggregator.observe(snapshot), 0)
+        self.assert_totals(snapshot, 2, 3.0)
+
+        # The active block completes
+        completed = self.block(active.start, 80, 0.8)
+        snapshot = cm.BlockIndex([before_period, first, second, completed])
+        self.assertEqual(self.aggregator.observe(snapshot), 1)
+        self.assert_totals(snapshot, 3, 3.8)
+
+        # A new billing period starts: the totals restart from the blocks already in it
+        next_period = (self.aggregator.period_start + timedelta(days=40)).replace(day=1)
+        with mock.patch.object(cm, "get_subscription_period_start", return_value=next_period):
+            self.assertTrue(self.aggregator.check_rollover())
+            self.assertFalse(self.aggregator.check_rollover())
+            new_start = self.aggregator.period_start_epoch
+            self.assert_totals(snapshot, 0, 0.0)
+
+            in_new_period = self.block(new_start + 2 * HOUR, 300, 3.0)
+            snapshot = cm.BlockIndex(list(snapshot) + [in_new_period])
+            self.assertEqual(self.aggregator.observe(snapshot), 1)
+            self.assert_totals(snapshot, 1, 3.0)
+
+        # A fresh aggregator over the same store agrees with the running totals
+        with mock.patch.object(cm, "get_subscription_period_start", return_value=next_period):
+            reloaded = cm.PeriodAggregator(self.store, 1)
+        self.assertEqual((reloaded.sessions, reloaded.cost), (1, 3.0))
+
+    def test_rebuild_matches_observe(self):
+        blocks = cm.BlockIndex([self.block(self.period + i * 6 * HOUR, 100 * i, 0.25 * i) for i in range(1, 6)])
+        self.aggregator.rebuild(blocks)
+        self.assert_totals(blocks, 5, 3.75)
+
+
+if __name__ == "__main__":
+    unittest.main()
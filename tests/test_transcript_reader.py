@@ -0,0 +1,105 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import claude_monitor as cm
+
+
+def epoch(text: str) -> float:
+    return datetime.fromisoformat(text).replace(tzinfo=timezone.utc).timestamp()
+
+
+def entry(timestamp: str, tokens: int, message_id: str) -> str:
+    return json.dumps({
+        "timestamp": timestamp + "Z",
+        "requestId": f"req-{message_id}",
+        "costUSD": tokens / 1000,
+        "message": {"id": message_id, "model": "claude-sonnet-4", "usage": {"input_tokens": tokens}},
+    })
+
+
+class TranscriptReaderTest(unittest.TestCase):
+    """TranscriptReader against a fixture `projects` directory."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self._tmp.name
+        self.project = os.path.join(self.data_dir, "projects", "demo")
+        os.makedirs(self.project)
+        self.reader = cm.TranscriptReader(data_dirs=[self.data_dir])
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, name: str, *lines: str):
+        with open(os.path.join(self.project, name), "a") as f:
+            f.write("".join(line + "\n" for line in lines))
+
+    def non_gap_blocks(self, now: str) -> list:
+        return [b for b in self.reader.blocks(now=epoch(now))["blocks"] if not b["isGap"]]
+
+    def test_entries_become_hour_aligned_blocks_and_gaps(self):
+        self.write("a.jsonl", entry("2026-01-01T10:30:00", 100, "m1"), entry("2026-01-01T12:00:00", 20, "m2"),
+                   entry("2026-01-01T20:10:00", 5, "m3"))
+        self.reader.poll()
+        blocks = self.reader.blocks(now=epoch("2026-01-01T21:00:00"))["blocks"]
+        self.assertEqual([b["isGap"] for b in blocks], [False, True, False])
+        self.assertEqual(blocks[0]["startTime"], "2026-01-01T10:00:00.000Z")
+        self.assertEqual(blocks[0]["totalTokens"], 120)
+        self.assertFalse(blocks[0]["isActive"])
+        self.assertTrue(blocks[2]["isActive"])
+
+    def test_out_of_order_entry_before_first_entry_of_its_block(self):
+        self.write("a.jsonl", entry("2026-01-01T10:30:00", 100, "m1"))
+        self.reader.poll()
+        self.write("b.jsonl", entry("2026-01-01T10:15:00", 50, "m2"))
+        self.reader.poll()
+        blocks = self.non_gap_blocks("2026-01-01T18:00:00")
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0]["totalTokens"], 150)
+        self.assertEqual(blocks[0]["entries"], 2)
+
+    def test_out_of_order_entry_before_all_blocks(self):
+        self.write("a.jsonl", entry("2026-01-01T10:30:00", 100, "m1"))
+        self.reader.poll()
+        self.write("b.jsonl", entry("2026-01-01T02:00:00", 7, "m2"))
+        self.reader.poll()
+        blocks = self.non_gap_blocks("2026-01-01T18:00:00")
+        self.assertEqual([b["totalTokens"] for b in blocks], [7, 100])
+
+    def test_only_appended_lines_are_read_and_duplicates_dropped(self):
+        self.write("a.jsonl", entry("2026-01-01T10:30:00", 100, "m1"))
+        self.assertEqual(self.reader.poll(), 1)
+        self.assertEqual(self.reader.poll(), 0)
+        self.write("a.jsonl", entry("2026-01-01T10:40:00", 10, "m2"))
+        self.write("copy.jsonl", entry("2026-01-01T10:30:00", 100, "m1"))
+        self.assertEqual(self.reader.poll(), 1)
+        self.assertEqual(self.non_gap_blocks("2026-01-01T11:00:00")[0]["totalTokens"], 110)
+
+    def test_completed_blocks_are_reused_between_polls(self):
+        self.write("a.jsonl", entry("2026-01-01T10:30:00", 100, "m1"), entry("2026-01-01T20:10:00", 5, "m2"))
+        self.reader.poll()
+        now = epoch("2026-01-01T21:00:00")
+        first = self.reader.blocks(now=now)["blocks"]
+        self.write("a.jsonl", entry("2026-01-01T20:20:00", 5, "m3"))
+        self.reader.poll()
+        second = self.reader.blocks(now=now)["blocks"]
+        self.assertIs(second[0], first[0])
+        self.assertIsNot(second[-1], first[-1])
+        self.assertEqual(second[-1]["totalTokens"], 10)
+
+    def test_fetch_indexed_matches_fetch(self):
+        self.write("a.jsonl", entry("2026-01-01T10:30:00", 100, "m1"), entry("2026-01-01T20:10:00", 5, "m2"))
+        data, index = self.reader.fetch_indexed()
+        expected = cm.BlockIndex.from_data(data)
+        self.assertEqual([(b.id, b.start, b.total_tokens) for b in index],
+                         [(b.id, b.start, b.total_tokens) for b in expected])
+
+
+if __name__ == "__main__":
+    unittest.main()